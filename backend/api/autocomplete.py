@@ -0,0 +1,203 @@
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .cache import get_version
+from .models import Ingredient
+from .snapshots import INGREDIENTS_VERSION_KEY
+
+MAGIC = b'FGAC0001'
+HEADER = struct.Struct('<8sIIQQQ')
+ENTRY = struct.Struct('<IHIB')
+ITEM = struct.Struct('<II')
+
+FULL_NAME = 0
+WORD_START = 1
+
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_START = 2
+
+WORD_RE = re.compile(r'\w+')
+
+
+def fold(value):
+    return value.casefold().strip()
+
+
+def build_index_file(path, ingredients):
+    """Записывает индекс в файл атомарно.
+
+    Файл состоит из заголовка, отсортированной по ключу таблицы
+    записей, таблицы ингредиентов и блока байтов с ключами и готовым
+    JSON каждого ингредиента.
+    """
+    blob = bytearray()
+    items = []
+    keys = []
+    for position, (pk, name, unit) in enumerate(ingredients):
+        content = json.dumps(
+            {'id': pk, 'name': name, 'measurement_unit': unit},
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ).encode()
+        items.append((len(blob), len(content)))
+        blob += content
+        folded = fold(name)
+        keys.append((folded.encode(), position, FULL_NAME))
+        for word in WORD_RE.finditer(folded):
+            if word.start():
+                keys.append(
+                    (folded[word.start():].encode(), position, WORD_START)
+                )
+    keys.sort()
+    entries = []
+    for key, position, kind in keys:
+        entries.append((len(blob), len(key), position, kind))
+        blob += key
+
+    entries_offset = HEADER.size
+    items_offset = entries_offset + ENTRY.size * len(entries)
+    blob_offset = items_offset + ITEM.size * len(items)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(
+            MAGIC, len(entries), len(items),
+            entries_offset, items_offset, blob_offset,
+        ))
+        for entry in entries:
+            index_file.write(ENTRY.pack(*entry))
+        for item in items:
+            index_file.write(ITEM.pack(*item))
+        index_file.write(blob)
+    os.replace(tmp_path, path)
+
+
+class PrefixIndex:
+    """Отображённый в память индекс; одна копия на все воркеры."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as index_file:
+            self.buffer = mmap.mmap(
+                index_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        (magic, self.entries_count, self.items_count, self.entries_offset,
+         self.items_offset, self.blob_offset) = HEADER.unpack_from(
+            self.buffer
+        )
+        if magic != MAGIC:
+            raise ValueError(f'Неизвестный формат индекса: {path}')
+
+    def entry(self, index):
+        key_offset, key_length, position, kind = ENTRY.unpack_from(
+            self.buffer, self.entries_offset + ENTRY.size * index
+        )
+        start = self.blob_offset + key_offset
+        return self.buffer[start:start + key_length], position, kind
+
+    def item(self, position):
+        offset, length = ITEM.unpack_from(
+            self.buffer, self.items_offset + ITEM.size * position
+        )
+        start = self.blob_offset + offset
+        return self.buffer[start:start + length]
+
+    def lower_bound(self, key):
+        low, high = 0, self.entries_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def search(self, query, limit=None):
+        """JSON ингредиентов, подходящих под запрос, по убыванию релевантности.
+
+        Сначала точное совпадение названия, затем начало названия,
+        затем начало любого слова в названии.
+        """
+        query = fold(query).encode()
+        ranks = {}
+        index = self.lower_bound(query)
+        while index < self.entries_count:
+            key, position, kind = self.entry(index)
+            if not key.startswith(query):
+                break
+            if kind == WORD_START:
+                rank = RANK_WORD_START
+            elif key == query:
+                rank = RANK_EXACT
+            else:
+                rank = RANK_PREFIX
+            if rank < ranks.get(position, (RANK_WORD_START + 1,))[0]:
+                ranks[position] = (rank, len(key))
+            index += 1
+        positions = sorted(ranks, key=lambda position: (
+            ranks[position][0], ranks[position][1], position
+        ))
+        return [self.item(position) for position in positions[:limit]]
+
+
+class IngredientAutocomplete:
+    """Автодополнение ингредиентов без обращений к базе на запрос.
+
+    Индекс строится один раз на версию справочника, кладётся в файл
+    и отображается в память каждым воркером.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get_index(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.index = self.load(version)
+                    self.version = version
+        return self.index
+
+    def load(self, version):
+        directory = settings.AUTOCOMPLETE_INDEX_DIR
+        path = os.path.join(directory, f'ingredients-{version}.idx')
+        try:
+            return PrefixIndex(path)
+        except FileNotFoundError:
+            pass
+        os.makedirs(directory, exist_ok=True)
+        build_index_file(
+            path,
+            Ingredient.objects.order_by('id').values_list(
+                'id', 'name', 'measurement_unit'
+            ),
+        )
+        index = PrefixIndex(path)
+        for old_path in glob.glob(
+            os.path.join(directory, 'ingredients-*.idx')
+        ):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+        return index
+
+    def response(self, query, limit=None):
+        items = self.get_index().search(query, limit)
+        return HttpResponse(
+            b'[' + b','.join(items) + b']', content_type='application/json'
+        )
+
+
+ingredient_autocomplete = IngredientAutocomplete()
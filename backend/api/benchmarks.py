@@ -0,0 +1,150 @@
+import random
+import resource
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from users.models import ShoppingCart
+from .cache import RECIPES_VERSION_KEY, bump_version
+from .catalog import recipe_catalog
+from .models import Ingredient, Recipe, RecipeToIngredient, Tag
+from .snapshots import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
+from .utils import add_to_shopping_totals
+
+User = get_user_model()
+
+PREFIX = 'benchmark'
+IMAGE = 'food/images/benchmark.gif'
+
+
+def forget_cached_state():
+    """Сбрасывает снимки и кэши, которые видели синтетические строки."""
+    for key in (
+        TAGS_VERSION_KEY, INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY
+    ):
+        bump_version(key)
+    recipe_catalog.invalidate()
+
+
+def created(model, **lookup):
+    """Строки после bulk_create: на sqlite он не возвращает ключи."""
+    return list(model.objects.filter(**lookup).order_by('id'))
+
+
+@contextmanager
+def synthetic_data(**options):
+    """Синтетический каталог в транзакции, которая всегда откатывается.
+
+    bulk_create не шлёт сигналов, поэтому версии справочников и снимок
+    каталога сбрасываются вручную при входе и после отката.
+    """
+    try:
+        with transaction.atomic():
+            data = SyntheticData(**options)
+            forget_cached_state()
+            yield data
+            transaction.set_rollback(True)
+    finally:
+        forget_cached_state()
+
+
+class SyntheticData:
+    """Пользователи, теги, ингредиенты и рецепты для замеров."""
+
+    def __init__(self, tags=8, authors=50, ingredients=500, seed=0):
+        self.rng = random.Random(seed)
+        User.objects.bulk_create(
+            User(
+                username=f'{PREFIX}-{number}',
+                email=f'{PREFIX}-{number}@example.com',
+                password='!',
+            )
+            for number in range(authors + 1)
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'{PREFIX} {number}', slug=f'{PREFIX}-{number}')
+            for number in range(tags)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{PREFIX} {number}', measurement_unit='г')
+            for number in range(ingredients)
+        )
+        self.user, *self.authors = created(
+            User, username__startswith=f'{PREFIX}-'
+        )
+        self.tags = created(Tag, slug__startswith=f'{PREFIX}-')
+        self.ingredients = created(Ingredient, name__startswith=PREFIX)
+        self.recipe_ids = []
+
+    def grow(self, total, ingredients_per_recipe=8):
+        """Добавляет рецепты, пока их не станет total."""
+        count = total - len(self.recipe_ids)
+        if count <= 0:
+            return
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.rng.choice(self.authors),
+                name=f'{PREFIX} {len(self.recipe_ids) + number}',
+                text=PREFIX,
+                cooking_time=self.rng.randint(1, 120),
+                image=IMAGE,
+            )
+            for number in range(count)
+        )
+        ids = list(Recipe.objects.filter(text=PREFIX).order_by(
+            'id'
+        ).values_list('id', flat=True))[len(self.recipe_ids):]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=pk, tag_id=tag.pk)
+            for pk in ids
+            for tag in self.rng.sample(self.tags, self.rng.randint(1, 3))
+        )
+        RecipeToIngredient.objects.bulk_create(
+            RecipeToIngredient(
+                recipe_id=pk, ingredient_id=ingredient.pk,
+                amount=self.rng.randint(1, 500),
+            )
+            for pk in ids
+            for ingredient in self.rng.sample(
+                self.ingredients, ingredients_per_recipe
+            )
+        )
+        self.recipe_ids.extend(ids)
+
+    def fill_cart(self, count):
+        """Кладёт в корзину пользователя первые count рецептов."""
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.user.shopping_totals.all().delete()
+        ids = self.recipe_ids[:count]
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe_id=pk) for pk in ids
+        )
+        add_to_shopping_totals(ids, self.user.pk)
+
+
+def timings(function, repeat):
+    """Время вызовов function в миллисекундах."""
+    result = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def describe(values):
+    return 'p50 {:.2f}, p95 {:.2f} мс'.format(
+        statistics.median(values), percentile(values, 0.95)
+    )
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
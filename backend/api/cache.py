@@ -0,0 +1,91 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+from foodgram.const import (RESPONSE_CACHE_FRESH_TIMEOUT,
+                            RESPONSE_CACHE_LOCK_TIMEOUT,
+                            RESPONSE_CACHE_STALE_TIMEOUT)
+
+RECIPES_VERSION_KEY = 'version:recipes'
+
+response_cache = ConnectionProxy(caches, 'responses')
+
+
+def initial_version():
+    """Начальная версия, не совпадающая с ранее выданными."""
+    return time.time_ns()
+
+
+def get_version(key):
+    version = response_cache.get(key)
+    if version is None:
+        response_cache.add(key, initial_version(), None)
+        version = response_cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Делает устаревшими все записи, сохранённые под прошлой версией.
+
+    Возвращает новую версию.
+    """
+    try:
+        return response_cache.incr(key)
+    except ValueError:
+        version = initial_version()
+        response_cache.set(key, version, None)
+        return version
+
+
+def request_cache_key(prefix, request, exclude=()):
+    """Ключ кэша по хосту и нормализованной строке запроса.
+
+    Параметры из exclude в ключ не входят.
+    """
+    params = request.query_params
+    query = urlencode(sorted(
+        (name, value)
+        for name in params
+        if name not in exclude
+        for value in params.getlist(name)
+    ))
+    digest = hashlib.sha1(
+        f'{request.get_host()}?{query}'.encode()
+    ).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def get_or_refresh(key, version_key, build):
+    """Данные из кэша с отдачей устаревшей записи на время обновления.
+
+    Запись считается свежей, пока не истёк её срок и не сменилась
+    версия. Устаревшую запись обновляет только один воркер, взявший
+    блокировку, остальные в это время отдают прежние данные.
+    """
+    version = get_version(version_key)
+    entry = response_cache.get(key)
+    if entry is not None:
+        if entry['version'] == version and entry['fresh_until'] > time.time():
+            return entry['data']
+        if not response_cache.add(
+            f'{key}:lock', True, RESPONSE_CACHE_LOCK_TIMEOUT
+        ):
+            return entry['data']
+    try:
+        data = build()
+        response_cache.set(
+            key,
+            {
+                'version': version,
+                'fresh_until': time.time() + RESPONSE_CACHE_FRESH_TIMEOUT,
+                'data': data,
+            },
+            RESPONSE_CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if entry is not None:
+            response_cache.delete(f'{key}:lock')
+    return data
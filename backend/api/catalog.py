@@ -0,0 +1,210 @@
+import threading
+from collections import namedtuple
+
+from users.models import Favorite, ShoppingCart
+from .cache import RECIPES_VERSION_KEY, get_version
+from .filters import RecipeFilter
+from .models import Recipe
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SUPPORTED_PARAMS = frozenset((
+    'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'page', 'limit',
+    'facets',
+))
+
+CatalogState = namedtuple(
+    'CatalogState', ('version', 'ids', 'authors', 'alive', 'tags')
+)
+
+
+class RecipeSelection:
+    """Отфильтрованные рецепты как последовательность для Paginator.
+
+    Длина известна из каталога, а строки из базы запрашиваются
+    только для нарезанной страницы.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        ids = self.ids[item].tolist()
+        if not isinstance(item, slice):
+            ids = [ids]
+        recipes = self.queryset.in_bulk(ids)
+        page = [recipes[pk] for pk in ids if pk in recipes]
+        return page if isinstance(item, slice) else page[0]
+
+
+class RecipeCatalog:
+    """Колоночный снимок каталога рецептов в памяти воркера.
+
+    Хранит идентификаторы в порядке (-pub_date, -id), столбец авторов
+    и по битовой маске на каждый тег. Страница частых запросов списка
+    считается векторными операциями над масками, а из базы читаются
+    только рецепты этой страницы.
+
+    Снимок собран под версией рецептов из общего кэша и собирается
+    заново, когда она меняется. Записи своего процесса применяются
+    сигналами на месте, и снимок принимает версию, выданную этой
+    записи, если она следующая за его собственной.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.lock = threading.Lock()
+        self.written = threading.local()
+
+    @property
+    def available(self):
+        return np is not None
+
+    def get_state(self):
+        version = get_version(RECIPES_VERSION_KEY)
+        state = self.state
+        if state is None or state.version != version:
+            with self.lock:
+                state = self.state
+                if state is None or state.version != version:
+                    state = self.state = self.build(version)
+        return state
+
+    def build(self, version):
+        rows = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', 'author_id'
+            )
+        )
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        authors = np.array([row[1] for row in rows], dtype=np.int64)
+        positions = {pk: position for position, pk in enumerate(ids.tolist())}
+        tags = {}
+        for recipe_id, slug in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__slug'
+        ).iterator():
+            if recipe_id in positions:
+                mask = tags.setdefault(slug, np.zeros(len(ids), dtype=bool))
+                mask[positions[recipe_id]] = True
+        return CatalogState(
+            version, ids, authors, np.ones(len(ids), dtype=bool), tags
+        )
+
+    def select(self, request, queryset):
+        """Выборка для запроса или None, если ответить может только SQL."""
+        if not self.available or not set(
+            request.query_params
+        ) <= SUPPORTED_PARAMS:
+            return None
+        filterset = RecipeFilter(
+            request.query_params, queryset=queryset, request=request
+        )
+        if not filterset.is_valid():
+            return None
+        data = filterset.form.cleaned_data
+        state = self.get_state()
+        mask = state.alive.copy()
+        if data.get('tags'):
+            tags_mask = np.zeros(len(state.ids), dtype=bool)
+            for slug in data['tags']:
+                if slug in state.tags:
+                    tags_mask |= state.tags[slug]
+            mask &= tags_mask
+        if data.get('author'):
+            mask &= np.isin(state.authors, data['author'])
+        user = request.user
+        if user.is_authenticated:
+            for field, model in (
+                ('is_favorited', Favorite),
+                ('is_in_shopping_cart', ShoppingCart),
+            ):
+                if data.get(field):
+                    mask &= np.isin(state.ids, np.fromiter(
+                        model.objects.filter(user=user).values_list(
+                            'recipe_id', flat=True
+                        ),
+                        dtype=np.int64,
+                    ))
+        return RecipeSelection(state.ids[mask], queryset)
+
+    def invalidate(self):
+        with self.lock:
+            self.state = None
+
+    def expect(self, version):
+        """Запоминает версию, которую получила запись этого потока.
+
+        Сигналы сдвигают версию раньше, чем меняют снимок, поэтому
+        следующее изменение снимка в потоке относится к этой записи.
+        """
+        self.written.version = version
+
+    def replace(self, state):
+        """Ставит снимок с изменениями своей записи.
+
+        Если между сборкой снимка и записью версию сдвигал кто-то ещё,
+        снимок остаётся под прежней версией и соберётся заново.
+        """
+        version = getattr(self.written, 'version', None)
+        if version == state.version + 1:
+            state = state._replace(version=version)
+        self.state = state
+
+    def touch(self):
+        """Запись рецепта, не меняющая снимок."""
+        with self.lock:
+            if self.state is not None:
+                self.replace(self.state)
+
+    def add(self, recipe_id, author_id):
+        """Новый рецепт - самый свежий, он встаёт в начало."""
+        with self.lock:
+            state = self.state
+            if state is None or recipe_id in state.ids:
+                return
+            self.replace(CatalogState(
+                state.version,
+                np.concatenate(([recipe_id], state.ids)),
+                np.concatenate(([author_id], state.authors)),
+                np.concatenate(([True], state.alive)),
+                {
+                    slug: np.concatenate(([False], mask))
+                    for slug, mask in state.tags.items()
+                },
+            ))
+
+    def remove(self, recipe_id):
+        with self.lock:
+            state = self.state
+            if state is None:
+                return
+            alive = state.alive.copy()
+            alive[state.ids == recipe_id] = False
+            self.replace(state._replace(alive=alive))
+
+    def set_tags(self, recipe_id, slugs):
+        with self.lock:
+            state = self.state
+            if state is None:
+                return
+            position = state.ids == recipe_id
+            tags = {}
+            for slug in set(state.tags) | set(slugs):
+                mask = state.tags.get(slug)
+                mask = (
+                    np.zeros(len(state.ids), dtype=bool)
+                    if mask is None else mask.copy()
+                )
+                mask[position] = slug in slugs
+                tags[slug] = mask
+            self.replace(state._replace(tags=tags))
+
+
+recipe_catalog = RecipeCatalog()
@@ -0,0 +1,156 @@
+import csv
+import json
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from foodgram.const import (EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_MAX_ITEM,
+                            EXPORT_CHUNK_SIZE)
+from .pdf import BULLET
+from .utils import generate_shopping_list, shopping_list_items
+
+DEFAULT_EXPORT_FORMAT = 'pdf'
+CSV_HEADER = ('name', 'measurement_unit', 'amount')
+
+
+class ExportFormatNegotiation(DefaultContentNegotiation):
+    """Параметр format выбирает формат выгрузки, а не рендерер DRF."""
+
+    def filter_renderers(self, renderers, format):
+        return renderers
+
+
+class ExportCache:
+    """Готовые файлы списков покупок в памяти воркера.
+
+    Ключ - (пользователь, версия корзины, формат), поэтому запись
+    не нужно удалять при изменении корзины: её просто больше никто
+    не запросит. Давно не запрошенные файлы вытесняются, как только
+    их общий размер превышает max_bytes.
+    """
+
+    def __init__(self, max_bytes, max_item):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self.size = 0
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            content = self.files.get(key)
+            if content is not None:
+                self.files.move_to_end(key)
+            return content
+
+    def set(self, key, content):
+        if len(content) > self.max_item:
+            return
+        with self.lock:
+            old = self.files.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.files[key] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, evicted = self.files.popitem(last=False)
+                self.size -= len(evicted)
+
+    def collect(self, key, chunks):
+        """Отдаёт куски дальше и сохраняет файл, если тот не велик."""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            data = chunk.encode()
+            if parts is not None:
+                size += len(data)
+                if size > self.max_item:
+                    parts = None
+                else:
+                    parts.append(data)
+            yield data
+        if parts is not None:
+            self.set(key, b''.join(parts))
+
+
+export_cache = ExportCache(EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_MAX_ITEM)
+
+
+class Echo:
+    """Псевдофайл для csv.writer, отдающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def rows(user):
+    return shopping_list_items(user).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def txt_chunks(user):
+    for name, unit, amount in rows(user):
+        yield f'{BULLET} {name} {amount} {unit}\n'
+
+
+def csv_chunks(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows(user):
+        yield writer.writerow(row)
+
+
+def json_chunks(user):
+    separator = '['
+    for row in rows(user):
+        yield separator + json.dumps(
+            dict(zip(CSV_HEADER, row)), ensure_ascii=False
+        )
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+EXPORT_FORMATS = {
+    'txt': (txt_chunks, 'text/plain; charset=utf-8'),
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+    'json': (json_chunks, 'application/json'),
+    'pdf': (None, 'application/pdf'),
+}
+
+
+def shopping_list_response(request, export_format):
+    """Список покупок в нужном формате.
+
+    Текстовые форматы отдаются потоком по строкам таблицы сумм
+    корзины, так что память не растёт вместе с корзиной. PDF
+    собирается целиком. Файл неизменной корзины отдаётся из кэша,
+    а при совпадении ETag - ответом 304.
+    """
+    user = request.user
+    key = (user.pk, user.cart_version, export_format)
+    etag = '"cart-{}-{}-{}"'.format(*key)
+    chunks, content_type = EXPORT_FORMATS[export_format]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content = export_cache.get(key)
+        if content is not None:
+            response = HttpResponse(content, content_type=content_type)
+        elif not shopping_list_items(user).exists():
+            return None
+        elif chunks is None:
+            content = generate_shopping_list(user).getvalue()
+            export_cache.set(key, content)
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                export_cache.collect(key, chunks(user)),
+                content_type=content_type,
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{export_format}"'
+        )
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
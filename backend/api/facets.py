@@ -0,0 +1,82 @@
+from django.db.models import Count, Q
+
+from foodgram.const import FACET_AUTHORS_LIMIT
+from .cache import RECIPES_VERSION_KEY, get_or_refresh, request_cache_key
+from .filters import RecipeFilter
+from .models import Recipe, Tag
+
+FACET_FILTERS = {'tags': 'tags', 'author': 'author'}
+PAGINATION_PARAMS = ('page', 'limit', 'cursor', 'pagination')
+
+
+def parse_facets(value):
+    """Запрошенные фасеты или None, если среди них есть неизвестные."""
+    facets = [facet.strip() for facet in value.split(',') if facet.strip()]
+    if not set(facets) <= set(FACET_FILTERS):
+        return None
+    return list(dict.fromkeys(facets))
+
+
+def filtered_recipes(request, facet):
+    """Рецепты под текущий фильтр без фильтра по самому фасету.
+
+    Так у каждого тега видно, сколько рецептов вернёт его выбор,
+    а не пересечение с уже выбранными тегами.
+    """
+    params = request.query_params.copy()
+    params.pop(FACET_FILTERS[facet], None)
+    return RecipeFilter(
+        params, queryset=Recipe.objects.all(), request=request
+    ).qs.order_by()
+
+
+def tags_facet(recipes):
+    return list(
+        Tag.objects.annotate(
+            count=Count('recipes', filter=Q(recipes__in=recipes.values('pk')))
+        ).order_by('id').values('id', 'slug', 'count')
+    )
+
+
+def author_facet(recipes):
+    rows = (
+        recipes.values('author_id', 'author__username')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'author_id')[:FACET_AUTHORS_LIMIT]
+    )
+    return [
+        {
+            'id': row['author_id'],
+            'username': row['author__username'],
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+
+
+FACET_BUILDERS = {'tags': tags_facet, 'author': author_facet}
+
+
+def build_facets(request, facets):
+    return {
+        facet: FACET_BUILDERS[facet](filtered_recipes(request, facet))
+        for facet in facets
+    }
+
+
+def recipe_facets(request, facets):
+    """Счётчики фасетов для текущего фильтра рецептов.
+
+    Каждый фасет считается одним агрегирующим запросом. Для анонимов
+    результат кэшируется по сигнатуре фильтра без параметров
+    пагинации, так что все страницы одной выборки делят запись.
+    """
+    if request.user.is_authenticated:
+        return build_facets(request, facets)
+    return get_or_refresh(
+        request_cache_key(
+            'recipes:facets', request, exclude=PAGINATION_PARAMS
+        ),
+        RECIPES_VERSION_KEY,
+        lambda: build_facets(request, facets),
+    )
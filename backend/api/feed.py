@@ -0,0 +1,207 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from foodgram.const import (FEED_FANOUT_BATCH_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
+                            FEED_FANOUT_WORKERS, FEED_TIMELINE_LENGTH)
+from users.models import Subscribe
+from .models import Recipe, TimelineEntry
+
+User = get_user_model()
+
+# Очередь рассылки живёт в памяти воркера: при его перезапуске
+# неразосланные рецепты теряются, и ленты восстанавливает команда
+# rebuild_timelines.
+fanout_executor = ThreadPoolExecutor(
+    max_workers=FEED_FANOUT_WORKERS, thread_name_prefix='feed-fanout'
+)
+
+
+def fans_out(author):
+    """Рассылаются ли рецепты автора по лентам подписчиков.
+
+    Рецепты авторов с большим числом подписчиков не копируются
+    в ленты, а подмешиваются при чтении.
+    """
+    return author.followers_count <= FEED_FANOUT_MAX_FOLLOWERS
+
+
+def trim_timelines(user_ids):
+    """Оставляет в лентах только FEED_TIMELINE_LENGTH свежих рецептов."""
+    sql, params = TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).annotate(position=Window(
+        RowNumber(),
+        partition_by=F('user_id'),
+        order_by=(F('pub_date').desc(), F('recipe_id').desc()),
+    )).order_by().values('id', 'position').query.sql_with_params()
+    TimelineEntry.objects.filter(id__in=RawSQL(
+        f'SELECT ranked.id FROM ({sql}) ranked '
+        f'WHERE ranked.position > %s',
+        (*params, FEED_TIMELINE_LENGTH),
+    )).delete()
+
+
+def fan_out(recipe_id):
+    """Кладёт рецепт в ленты подписчиков автора порциями."""
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).values(
+            'author_id', 'pub_date'
+        ).first()
+        if recipe is None:
+            return
+        followers = Subscribe.objects.filter(
+            author_id=recipe['author_id']
+        ).order_by('id').values_list('id', 'user_id')
+        last_id = 0
+        while True:
+            batch = list(
+                followers.filter(id__gt=last_id)[:FEED_FANOUT_BATCH_SIZE]
+            )
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            user_ids = [user_id for _, user_id in batch]
+            with transaction.atomic():
+                TimelineEntry.objects.bulk_create(
+                    [
+                        TimelineEntry(
+                            user_id=user_id,
+                            recipe_id=recipe_id,
+                            pub_date=recipe['pub_date'],
+                        )
+                        for user_id in user_ids
+                    ],
+                    ignore_conflicts=True,
+                )
+                trim_timelines(user_ids)
+    finally:
+        close_old_connections()
+
+
+def schedule_fan_out(recipe):
+    """Рассылка нового рецепта в фоне после коммита транзакции."""
+    if fans_out(recipe.author):
+        transaction.on_commit(
+            lambda: fanout_executor.submit(fan_out, recipe.pk)
+        )
+
+
+def add_author_to_timeline(user_id, author):
+    """Заполняет ленту нового подписчика свежими рецептами автора."""
+    if not fans_out(author):
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for pk, pub_date in Recipe.objects.filter(author=author)
+            .order_by('-pub_date', '-id')
+            .values_list('id', 'pub_date')[:FEED_TIMELINE_LENGTH]
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user_id])
+
+
+def remove_authors_from_timeline(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def fill_timelines(subscriptions):
+    """Добавляет в ленты свежие рецепты авторов из подписок.
+
+    Одним INSERT ... SELECT берутся не больше FEED_TIMELINE_LENGTH
+    рецептов на подписку, авторы с большим числом подписчиков
+    пропускаются, затем затронутые ленты обрезаются. Возвращает
+    число добавленных записей.
+    """
+    subscriptions = subscriptions.filter(
+        author__followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS,
+        author__recipes__isnull=False,
+    )
+    sql, params = subscriptions.annotate(
+        recipe_id=F('author__recipes__id'),
+        recipe_pub_date=F('author__recipes__pub_date'),
+        position=Window(
+            RowNumber(),
+            partition_by=F('id'),
+            order_by=(
+                F('author__recipes__pub_date').desc(),
+                F('author__recipes__id').desc(),
+            ),
+        ),
+    ).order_by().values(
+        'user_id', 'recipe_id', 'recipe_pub_date', 'position'
+    ).query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+            f'(user_id, recipe_id, pub_date) '
+            f'SELECT ranked.user_id, ranked.recipe_id, ranked.recipe_pub_date '
+            f'FROM ({sql}) ranked WHERE ranked.position <= %s '
+            f'ON CONFLICT DO NOTHING',
+            (*params, FEED_TIMELINE_LENGTH),
+        )
+        added = cursor.rowcount
+    if added:
+        trim_timelines(subscriptions.values('user_id'))
+    return added
+
+
+def after_position(queryset, date_field, id_field, position, reverse):
+    """Строки строго после ключа (date, id) в порядке ленты.
+
+    Условие на дату отдельно от OR даёт индексу границу диапазона.
+    """
+    if position is None:
+        return queryset
+    date, pk = position
+    lookup = 'gt' if reverse else 'lt'
+    return queryset.filter(**{f'{date_field}__{lookup}e': date}).filter(
+        Q(**{f'{date_field}__{lookup}': date})
+        | Q(**{f'{id_field}__{lookup}': pk})
+    )
+
+
+def feed_positions(user, limit, position=None, reverse=False):
+    """Ключи (pub_date, id) следующих limit рецептов ленты.
+
+    Лента читается по индексу (user, -pub_date, -recipe) своей
+    таблицы, рецепты авторов с большим числом подписчиков - отдельным
+    запросом с тем же ограничением, затем обе выборки сливаются по
+    ключу. При reverse строки идут от ключа к началу ленты.
+    """
+    prefix = '' if reverse else '-'
+    timeline = after_position(
+        TimelineEntry.objects.filter(user=user),
+        'pub_date', 'recipe_id', position, reverse,
+    ).order_by(f'{prefix}pub_date', f'{prefix}recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    big_authors = after_position(
+        Recipe.objects.filter(author__in=User.objects.filter(
+            subscribing__user=user,
+            followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS,
+        ).values('pk')),
+        'pub_date', 'id', position, reverse,
+    ).order_by(f'{prefix}pub_date', f'{prefix}id').values_list(
+        'pub_date', 'id'
+    )[:limit]
+    page = []
+    seen = set()
+    for key in heapq.merge(timeline, big_authors, reverse=not reverse):
+        if key[1] not in seen:
+            seen.add(key[1])
+            page.append(key)
+            if len(page) == limit:
+                break
+    return page
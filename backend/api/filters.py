@@ -1,31 +1,84 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
+from users.models import Favorite, ShoppingCart
 from .models import Ingredient, Recipe
+from .search import search_recipes
+from .snapshots import tag_slug_choices
+
+
+class IntegerListField(forms.Field):
+    """Поле со списком чисел из повторяющегося параметра запроса."""
+
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(item) for item in value]
+        except (TypeError, ValueError):
+            raise ValidationError('Нужен список целых чисел.')
+
+
+class IntegerListFilter(filters.Filter):
+    field_class = IntegerListField
 
 
 class RecipeFilter(filters.FilterSet):
-    """Класс фильтра для рецептов."""
+    """Класс фильтра для рецептов.
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
-    author = filters.AllValuesMultipleFilter(field_name='author__id')
+    Фильтры по связанным таблицам построены на EXISTS, поэтому
+    рецепт не дублируется и DISTINCT не нужен, а допустимые слаги
+    тегов берутся из снимка справочника.
+    """
+
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_slug_choices, method='filter_tags'
+    )
+    author = IntegerListFilter(method='filter_author')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=value
+            )
+        ))
+
+    def filter_author(self, queryset, name, value):
+        return queryset.filter(author_id__in=value)
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
 
 
 class IngredientFilter(filters.FilterSet):
@@ -0,0 +1,43 @@
+from django.db import transaction
+
+from foodgram.const import FOLLOW_SET_CACHE_TIMEOUT
+from users.models import Subscribe
+from .cache import bump_version, get_version, response_cache
+
+
+def follows_version_key(user_id):
+    return f'version:follows:{user_id}'
+
+
+def load_follow_set(user_id):
+    """Идентификаторы авторов, на которых подписан пользователь.
+
+    Набор хранится в общем кэше под версией пользователя, поэтому
+    подписка и отписка делают устаревшей только его запись.
+    """
+    key = f'follows:{user_id}:{get_version(follows_version_key(user_id))}'
+    follow_set = response_cache.get(key)
+    if follow_set is None:
+        follow_set = frozenset(
+            Subscribe.objects.filter(user_id=user_id).values_list(
+                'author_id', flat=True
+            )
+        )
+        response_cache.set(key, follow_set, FOLLOW_SET_CACHE_TIMEOUT)
+    return follow_set
+
+
+def get_follow_set(request):
+    """Набор подписок текущего пользователя, один на запрос."""
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, 'follow_set'):
+        http_request.follow_set = load_follow_set(request.user.pk)
+    return http_request.follow_set
+
+
+def invalidate_follow_set(user_id):
+    transaction.on_commit(
+        lambda: bump_version(follows_version_key(user_id))
+    )
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+
+from foodgram.const import FRAGMENT_CACHE_TIMEOUT
+from .follows import get_follow_set
+from .models import Recipe
+from .serializers import RecipeReadSerializer
+
+FRAGMENT_FIELDS = ('id', 'author', 'pub_date', 'updated_at')
+
+
+def fragment_key(recipe, host):
+    return f'recipe:{recipe.pk}:{recipe.updated_at.timestamp()}:{host}'
+
+
+def render_recipes(recipes, context):
+    """Представления рецептов из кэша фрагментов.
+
+    Общая для всех пользователей часть рецепта кэшируется под ключом
+    с его updated_at, поэтому любое изменение рецепта, тегов или
+    профиля автора приводит к новому фрагменту. Флаги текущего
+    пользователя берутся из аннотаций рецептов и набора подписок.
+    """
+    recipes = list(recipes)
+    host = context['request'].get_host()
+    keys = {recipe.pk: fragment_key(recipe, host) for recipe in recipes}
+    fragments = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in fragments]
+    if missing:
+        instances = Recipe.objects.for_read(None).filter(pk__in=missing)
+        rendered = {}
+        for instance in instances:
+            data = RecipeReadSerializer(instance, context=context).data
+            rendered[fragment_key(instance, host)] = data
+            fragments[keys[instance.pk]] = data
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+    follow_set = get_follow_set(context['request'])
+    representations = []
+    for recipe in recipes:
+        data = dict(fragments[keys[recipe.pk]])
+        data['author'] = dict(
+            data['author'], is_subscribed=recipe.author_id in follow_set
+        )
+        data['is_favorited'] = recipe.is_favorited
+        data['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+        representations.append(data)
+    return representations
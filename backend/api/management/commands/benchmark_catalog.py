@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarks import describe, synthetic_data, timings
+from api.catalog import recipe_catalog
+from api.filters import RecipeFilter
+from api.models import Recipe
+from users.models import Favorite
+
+PAGE_SIZE = 6
+
+
+def cases(data):
+    tags = [tag.slug for tag in data.tags[:2]]
+    authors = [author.pk for author in data.authors[:5]]
+    return (
+        ('без фильтров', {}),
+        ('теги', {'tags': tags}),
+        ('авторы', {'author': authors}),
+        ('избранное', {'is_favorited': 1}),
+        ('корзина и теги', {'is_in_shopping_cart': 1, 'tags': tags}),
+    )
+
+
+def ordered_recipes():
+    return Recipe.objects.order_by('-pub_date', '-id')
+
+
+def catalog_page(request):
+    selection = recipe_catalog.select(request, ordered_recipes())
+    if selection is None:
+        raise CommandError('Каталог не отвечает на этот запрос.')
+    return len(selection), [recipe.pk for recipe in selection[:PAGE_SIZE]]
+
+
+def orm_page(request):
+    filterset = RecipeFilter(
+        request.query_params, queryset=ordered_recipes(), request=request
+    )
+    if not filterset.is_valid():
+        raise CommandError(filterset.errors)
+    queryset = filterset.qs
+    return queryset.count(), [recipe.pk for recipe in queryset[:PAGE_SIZE]]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение колоночного каталога рецептов с фильтрацией в ORM '
+        '(данные создаются в транзакции и откатываются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Число рецептов для каждого замера',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Число повторов каждого запроса',
+        )
+
+    def handle(self, *args, **options):
+        if not recipe_catalog.available:
+            raise CommandError('Для каталога нужен numpy.')
+        factory = APIRequestFactory()
+        with synthetic_data() as data:
+            for size in sorted(options['sizes']):
+                data.grow(size)
+                Favorite.objects.filter(user=data.user).delete()
+                Favorite.objects.bulk_create(
+                    Favorite(user=data.user, recipe_id=pk)
+                    for pk in data.recipe_ids[::10]
+                )
+                data.fill_cart(size // 10)
+                recipe_catalog.invalidate()
+                started = time.perf_counter()
+                recipe_catalog.get_state()
+                build = (time.perf_counter() - started) * 1000
+                self.stdout.write(
+                    f'{size} рецептов, сборка снимка {build:.0f} мс:'
+                )
+                for case, params in cases(data):
+                    request = Request(factory.get('/api/recipes/', params))
+                    request.user = data.user
+                    self.measure(case, request, options['repeat'])
+
+    def measure(self, case, request, repeat):
+        if catalog_page(request) != orm_page(request):
+            raise CommandError(f'Каталог и ORM расходятся: {case}.')
+        catalog = timings(lambda: catalog_page(request), repeat)
+        orm = timings(lambda: orm_page(request), repeat)
+        self.stdout.write(
+            f'  {case}: каталог {describe(catalog)}; ORM {describe(orm)}'
+        )
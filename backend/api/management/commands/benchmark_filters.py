@@ -0,0 +1,96 @@
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from django_filters import rest_framework as filters
+
+from api.benchmarks import describe, synthetic_data, timings
+from api.filters import RecipeFilter
+from api.models import Recipe
+
+PAGE_SIZE = 6
+
+
+class ScanningRecipeFilter(filters.FilterSet):
+    """Прежний фильтр: варианты проверяются через SELECT DISTINCT."""
+
+    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    author = filters.AllValuesMultipleFilter(field_name='author__id')
+
+    class Meta:
+        model = Recipe
+        fields = ('tags', 'author')
+
+
+FILTERSETS = (
+    ('EXISTS', RecipeFilter),
+    ('DISTINCT', ScanningRecipeFilter),
+)
+
+
+def cases(data):
+    tags = [tag.slug for tag in data.tags[:3]]
+    authors = [author.pk for author in data.authors[:3]]
+    return (
+        ('теги', {'tags': tags}),
+        ('авторы', {'author': authors}),
+        ('теги и авторы', {'tags': tags, 'author': authors}),
+    )
+
+
+def first_page(filterset_class, params):
+    filterset = filterset_class(
+        params, queryset=Recipe.objects.order_by('-pub_date', '-id')
+    )
+    if not filterset.is_valid():
+        raise CommandError(filterset.errors)
+    return list(filterset.qs.values_list('id', flat=True)[:PAGE_SIZE])
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер фильтров списка рецептов на растущем синтетическом каталоге '
+        '(данные создаются в транзакции и откатываются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Число рецептов для каждого замера',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Число повторов каждого запроса',
+        )
+
+    def handle(self, *args, **options):
+        with synthetic_data() as data:
+            for size in sorted(options['sizes']):
+                data.grow(size)
+                self.stdout.write(f'{size} рецептов:')
+                for case, params in cases(data):
+                    params = QueryDict(urlencode(params, doseq=True))
+                    for label, filterset_class in FILTERSETS:
+                        self.measure(
+                            case, label, filterset_class, params,
+                            options['repeat'],
+                        )
+
+    def measure(self, case, label, filterset_class, params, repeat):
+        first_page(filterset_class, params)
+        with CaptureQueriesContext(connection) as context:
+            first_page(filterset_class, params)
+        latencies = timings(
+            lambda: first_page(filterset_class, params), repeat
+        )
+        self.stdout.write(
+            f'  {case}, {label}: запросов {len(context)}, '
+            f'{describe(latencies)}'
+        )
@@ -0,0 +1,87 @@
+import tracemalloc
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+from api.benchmarks import describe, synthetic_data, timings
+from api.pdf import BULLET, FONT_NAME, FONT_PATH
+from api.utils import generate_shopping_list, shopping_list_items
+
+
+def platypus_render(lines):
+    """Прежний способ: шрифт и стили на каждый вызов, абзац на строку."""
+    buffer = BytesIO()
+    style = getSampleStyleSheet()['Normal']
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    style.fontName = FONT_NAME
+    SimpleDocTemplate(buffer, pagesize=A4).build(
+        [Paragraph(f'{BULLET} {line}', style) for line in lines]
+    )
+    buffer.seek(0)
+    return buffer
+
+
+def peak_memory_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер выгрузки списка покупок в PDF для корзин разного размера '
+        '(данные создаются в транзакции и откатываются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--carts',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Число рецептов в корзине для каждого замера',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=5000,
+            help='Размер справочника ингредиентов',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Число повторов каждой выгрузки',
+        )
+
+    def handle(self, *args, **options):
+        carts = sorted(options['carts'])
+        with synthetic_data(ingredients=options['ingredients']) as data:
+            data.grow(carts[-1])
+            for size in carts:
+                data.fill_cart(size)
+                lines = [
+                    f'{name} {amount} {unit}'
+                    for name, unit, amount in shopping_list_items(data.user)
+                ]
+                for label, render in (
+                    ('холст', lambda: generate_shopping_list(data.user)),
+                    ('platypus', lambda: platypus_render(lines)),
+                ):
+                    render()
+                    latencies = timings(render, options['repeat'])
+                    size_kb = len(render().getvalue()) / 1024
+                    self.stdout.write(
+                        f'{size} рецептов, {len(lines)} строк, {label}: '
+                        f'{describe(latencies)}, '
+                        f'пик памяти {peak_memory_mb(render):.1f} МБ, '
+                        f'файл {size_kb:.0f} КБ'
+                    )
@@ -0,0 +1,144 @@
+import heapq
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import describe, max_rss_mb, timings
+from api.suggest import INGREDIENT, RECIPE, TrigramIndex, trigrams
+from foodgram.const import SUGGEST_THRESHOLD
+
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'котлеты', 'плов', 'блины',
+    'запеканка', 'рагу', 'солянка', 'окрошка', 'гуляш', 'омлет', 'пюре',
+    'куриный', 'грибной', 'овощной', 'сырный', 'яблочный', 'рыбный',
+    'домашний', 'быстрый', 'постный', 'летний', 'острый', 'сладкий',
+    'морковь', 'картофель', 'капуста', 'свёкла', 'лук', 'чеснок', 'рис',
+)
+
+
+def synthetic_name(rng):
+    words = rng.sample(WORDS, rng.randint(2, 4))
+    return f'{" ".join(words)} {rng.randint(1, 9999)}'
+
+
+def synthetic_query(rng):
+    word = rng.choice(WORDS)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:rng.randint(3, len(word))]
+    if kind == 1:
+        position = rng.randrange(len(word))
+        return word[:position] + word[position + 1:]
+    return f'{word} {rng.choice(WORDS)}'
+
+
+def ranking(grams, document_grams):
+    shared = len(grams & document_grams)
+    return (
+        round(shared / len(grams), 6),
+        round(shared / (len(grams) + len(document_grams) - shared), 6),
+    )
+
+
+def exact_ranking(index, query, limit):
+    """Лучшие оценки полным перебором документов, без отбора кандидатов."""
+    grams = trigrams(query)
+    required = max(math.ceil(SUGGEST_THRESHOLD * len(grams)), 1)
+    return heapq.nlargest(limit, (
+        ranking(grams, document_grams)
+        for _, document_grams in index.documents.values()
+        if len(grams & document_grams) >= required
+    ))
+
+
+def search_ranking(index, query, limit):
+    grams = trigrams(query)
+    return [
+        ranking(grams, index.documents[key][1])
+        for key, _, _ in index.search(query, limit)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Замер индекса подсказок на синтетических названиях'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='Число записей в индексе для каждого замера',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=1000,
+            help='Число поисковых запросов на замер',
+        )
+        parser.add_argument(
+            '--updates',
+            type=int,
+            default=1000,
+            help='Число записей журнала, докатываемых на индекс',
+        )
+        parser.add_argument(
+            '--checks',
+            type=int,
+            default=20,
+            help='Число запросов, сверяемых с полным перебором',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        for size in options['sizes']:
+            self.measure(
+                rng, size, options['queries'], options['updates'],
+                options['checks'],
+            )
+
+    def measure(self, rng, size, queries, updates, checks):
+        rss_before = max_rss_mb()
+        started = time.perf_counter()
+        index = TrigramIndex()
+        for pk in range(size):
+            index.add((RECIPE, pk), synthetic_name(rng))
+        for pk, word in enumerate(WORDS):
+            index.add((INGREDIENT, pk), word)
+        build = time.perf_counter() - started
+        rss_after = max_rss_mb()
+
+        latencies = timings(
+            lambda: index.search(synthetic_query(rng), 10), queries
+        )
+
+        started = time.perf_counter()
+        for _ in range(updates):
+            pk = rng.randrange(size)
+            if rng.random() < 0.1:
+                index.remove((RECIPE, pk))
+            else:
+                index.add((RECIPE, pk), synthetic_name(rng))
+        catch_up = (time.perf_counter() - started) * 1000
+
+        check_queries = list(WORDS[:checks]) + [
+            synthetic_query(rng) for _ in range(checks - len(WORDS))
+        ]
+        matched = sum(
+            search_ranking(index, query, 10)
+            == exact_ranking(index, query, 10)
+            for query in check_queries
+        )
+
+        self.stdout.write(
+            f'{size} записей: сборка {build:.1f} с, '
+            f'пик RSS +{rss_after - rss_before:.0f} МБ '
+            f'(всего {rss_after:.0f} МБ)\n'
+            f'  поиск: {describe(latencies)}\n'
+            f'  журнал: {updates} записей за {catch_up:.1f} мс\n'
+            f'  точность: {matched} из {len(check_queries)} выдач '
+            f'совпали с полным перебором'
+        )
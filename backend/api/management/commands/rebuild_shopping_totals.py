@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.models import RecipeToIngredient
+from api.utils import bump_cart_version
+from users.models import ShoppingCart, ShoppingTotal
+
+User = get_user_model()
+
+
+def expected_totals():
+    return ShoppingCart.objects.filter(
+        recipe__ingredient_list__isnull=False
+    ).values_list(
+        'user_id', 'recipe__ingredient_list__ingredient_id'
+    ).annotate(total=Sum('recipe__ingredient_list__amount')).order_by()
+
+
+def stored_totals():
+    return ShoppingTotal.objects.values_list(
+        'user_id', 'ingredient_id', 'total_amount'
+    ).order_by()
+
+
+class Command(BaseCommand):
+    help = 'Сверка и пересборка сумм списков покупок с корзинами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatched = {
+                row[0] for row in expected_totals().difference(
+                    stored_totals()
+                )
+            } | {
+                row[0] for row in stored_totals().difference(
+                    expected_totals()
+                )
+            }
+            if options['check']:
+                self.stdout.write(
+                    f'Пользователей с расхождениями: {len(mismatched)}'
+                )
+                return
+            ShoppingTotal.objects.all().delete()
+            self.fill()
+            bump_cart_version(User.objects.filter(pk__in=mismatched))
+        self.stdout.write(self.style.SUCCESS(
+            f'Суммы пересобраны, исправлено пользователей: {len(mismatched)}'
+        ))
+
+    def fill(self):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(ShoppingTotal._meta.db_table)} '
+                f'(user_id, ingredient_id, total_amount) '
+                f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+                f'FROM {quote(ShoppingCart._meta.db_table)} cart '
+                f'JOIN {quote(RecipeToIngredient._meta.db_table)} item '
+                f'ON item.recipe_id = cart.recipe_id '
+                f'GROUP BY cart.user_id, item.ingredient_id'
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.feed import fill_timelines
+from users.models import Subscribe
+
+
+class Command(BaseCommand):
+    help = (
+        'Дозаполнение лент подписчиков рецептами, рассылка которых '
+        'не дошла, например из-за перезапуска воркера'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            added = fill_timelines(Subscribe.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты дозаполнены, добавлено записей: {added}'
+        ))
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Recipe
+from api.utils import count_subquery
+from users.models import Favorite, ShoppingCart, Subscribe
+
+User = get_user_model()
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Сколько объектов пересчитывать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipes = self.recount(
+            Recipe.objects.all(),
+            chunk_size,
+            favorites_count=count_subquery(Favorite, 'recipe'),
+            in_carts_count=count_subquery(ShoppingCart, 'recipe'),
+        )
+        users = self.recount(
+            User.objects.all(),
+            chunk_size,
+            recipes_count=count_subquery(Recipe, 'author'),
+            followers_count=count_subquery(Subscribe, 'author'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: рецептов {recipes}, '
+            f'пользователей {users}'
+        ))
+
+    def recount(self, queryset, chunk_size, **counters):
+        """Обновляет счётчики порциями по возрастанию первичного ключа."""
+        last_pk = 0
+        total = 0
+        while True:
+            pks = list(
+                queryset.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                return total
+            with transaction.atomic():
+                queryset.filter(pk__in=pks).update(**counters)
+            total += len(pks)
+            last_pk = pks[-1]
@@ -24,7 +24,7 @@ class Command(BaseCommand):
                 measurement_unit = row['measurement_unit']
 
                 try:
-                    Ingredient.objects.create(
+                    Ingredient.objects.get_or_create(
                         name=ingredient_name,
                         measurement_unit=measurement_unit,
                     )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Min, Sum
+
+MAX_AMOUNT = 32767
+
+
+def merge_duplicate_recipe_ingredients(apps, schema_editor):
+    """Оставляет одну строку на пару (recipe, ingredient).
+
+    Количества дубликатов складываются в оставшуюся строку.
+    """
+    RecipeToIngredient = apps.get_model('api', 'RecipeToIngredient')
+    duplicates = (
+        RecipeToIngredient.objects.values('recipe_id', 'ingredient_id')
+        .annotate(keep_id=Min('id'), amount=Sum('amount'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        RecipeToIngredient.objects.filter(pk=group['keep_id']).update(
+            amount=min(group['amount'], MAX_AMOUNT)
+        )
+        RecipeToIngredient.objects.filter(
+            recipe_id=group['recipe_id'], ingredient_id=group['ingredient_id']
+        ).exclude(pk=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0012_auto_20240724_1129'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Aвтор'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(related_name='recipes', through='api.RecipeToIngredient', to='api.Ingredient', verbose_name='Ингредиенты'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(related_name='recipes', to='api.Tag', verbose_name='Теги'),
+        ),
+        migrations.AlterField(
+            model_name='recipetoingredient',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_list', to='api.ingredient'),
+        ),
+        migrations.AlterField(
+            model_name='recipetoingredient',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_list', to='api.recipe'),
+        ),
+        migrations.RunPython(
+            merge_duplicate_recipe_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='recipetoingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+    ]
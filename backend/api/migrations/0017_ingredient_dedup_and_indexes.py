@@ -0,0 +1,89 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MAX_AMOUNT = 32767
+
+CREATE_NAME_INDEX = (
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_upper_like '
+    'ON api_ingredient (UPPER(name::text) text_pattern_ops)'
+)
+DROP_NAME_INDEX = 'DROP INDEX IF EXISTS api_ingredient_name_upper_like'
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет по одному ингредиенту на пару (name, measurement_unit).
+
+    Ссылки рецептов на дубликаты переносятся на оставшийся ингредиент,
+    количества одного рецепта при этом складываются.
+    """
+    Ingredient = apps.get_model('api', 'Ingredient')
+    RecipeToIngredient = apps.get_model('api', 'RecipeToIngredient')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        keep_id = group['keep_id']
+        extra_ids = list(
+            Ingredient.objects.filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit'],
+            ).exclude(id=keep_id).values_list('id', flat=True)
+        )
+        for row in RecipeToIngredient.objects.filter(
+            ingredient_id__in=extra_ids
+        ):
+            kept = RecipeToIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=keep_id
+            ).first()
+            if kept is None:
+                row.ingredient_id = keep_id
+                row.save(update_fields=['ingredient'])
+            else:
+                kept.amount = min(kept.amount + row.amount, MAX_AMOUNT)
+                kept.save(update_fields=['amount'])
+                row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+def run_deferred_checks(apps, schema_editor):
+    """Проверяет отложенные внешние ключи до ALTER TABLE.
+
+    PostgreSQL не меняет таблицу, пока в транзакции остаются
+    отложенные проверки от перенесённых ссылок рецептов.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def create_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_NAME_INDEX)
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_NAME_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.RunPython(run_deferred_checks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_unit',
+            ),
+        ),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
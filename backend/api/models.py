@@ -1,9 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              UniqueConstraint, Value)
+from django.utils import timezone
 
 from foodgram.const import MAX_LENGTH, MAX_LENGTH_TAG, MIN_TIME_TO_COOK
+from users.models import Favorite, ShoppingCart
 
 User = get_user_model()
 
@@ -52,10 +57,62 @@ class Ingredient(models.Model):
         blank=False,
     )
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit',
+            )
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов."""
+
+    def for_read(self, user):
+        """Рецепты со всем, что нужно для RecipeReadSerializer.
+
+        Автор загружается тем же запросом, теги и ингредиенты
+        подгружаются prefetch'ем, а флаги текущего пользователя
+        считаются аннотациями Exists.
+        """
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_list',
+                queryset=RecipeToIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        ).with_user_flags(user)
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного и корзины."""
+        if user is None or user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    def touch(self):
+        """Отмечает рецепты изменёнными."""
+        return self.update(updated_at=timezone.now())
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -100,9 +157,38 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -133,3 +219,33 @@ class RecipeToIngredient(models.Model):
             UniqueConstraint(fields=['recipe', 'ingredient'],
                              name='unique_recipe_ingredient')
         ]
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика его автора."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
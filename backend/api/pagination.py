@@ -0,0 +1,288 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       LimitOffsetPagination,
+                                       PageNumberPagination)
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.const import (ESTIMATED_COUNT_CACHE_TIMEOUT,
+                            EXACT_COUNT_THRESHOLD)
+from .feed import feed_positions
+
+CURSOR_SWITCH_PARAM = 'pagination'
+CURSOR_SWITCH_VALUE = 'cursor'
+
+
+def estimate_count(queryset, threshold=EXACT_COUNT_THRESHOLD):
+    """Количество объектов в выборке и признак его точности.
+
+    До порога считается точно, но не дальше threshold + 1 строки.
+    Выше порога на PostgreSQL берётся оценка планировщика, на прочих
+    базах - точное значение, закэшированное на короткое время.
+    """
+    queryset = queryset.order_by().values('pk')
+    exact = queryset[:threshold + 1].count()
+    if exact <= threshold:
+        return exact, True
+    sql, params = queryset.query.sql_with_params()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), exact), False
+    key = 'count:' + hashlib.sha1(
+        f'{sql}{params}'.encode()
+    ).hexdigest()
+    return cache.get_or_set(
+        key, queryset.count, ESTIMATED_COUNT_CACHE_TIMEOUT
+    ), False
+
+
+class ProbedPage(Page):
+    """Страница, наличие следующей за которой узнаётся из самой выборки."""
+
+    def __init__(self, object_list, number, paginator, next_exists):
+        super().__init__(object_list, number, paginator)
+        self.next_exists = next_exists
+
+    def has_next(self):
+        return self.next_exists
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, не считающий COUNT(*) по большим выборкам.
+
+    Оценка идёт только в поле count. Если она неточна, страница
+    читается с одной лишней строкой, по которой и решается, есть ли
+    следующая: границы выборки не зависят от ошибки оценки.
+    """
+
+    @cached_property
+    def estimate(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count, True
+        return estimate_count(self.object_list)
+
+    @property
+    def count(self):
+        return self.estimate[0]
+
+    @property
+    def count_exact(self):
+        return self.estimate[1]
+
+    def page(self, number):
+        if self.count_exact:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return ProbedPage(
+            rows[:self.per_page], number, self, len(rows) > self.per_page
+        )
+
+
+class EstimatedCountPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с оценкой количества для больших выборок."""
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.page.paginator.count_exact
+        return response
+
+
+class EstimatedCountLimitOffsetPagination(LimitOffsetPagination):
+    """Пагинация limit/offset с оценкой количества для больших выборок.
+
+    Ссылка next строится по лишней строке выборки, а не по count.
+    """
+
+    count_exact = True
+    next_exists = False
+
+    def get_count(self, queryset):
+        count, self.count_exact = estimate_count(queryset)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = self.get_count(queryset)
+        self.offset = self.get_offset(request)
+        self.request = request
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0:
+            self.next_exists = False
+            return []
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.next_exists = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.next_exists:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.count_exact
+        return response
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов по ключу (pub_date, id)."""
+
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class FeedCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты по ключу (pub_date, id).
+
+    Курсор хранит ключ крайнего рецепта страницы, и следующая страница
+    читается по индексу ленты без смещений. Рецепты страницы затем
+    загружаются из переданной выборки по id.
+    """
+
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        position, reverse = None, False
+        if self.cursor is not None:
+            position = self.decode_position(self.cursor.position)
+            reverse = self.cursor.reverse
+        keys = feed_positions(
+            request.user, self.page_size + 1, position, reverse
+        )
+        has_more = len(keys) > self.page_size
+        keys = keys[:self.page_size]
+        if reverse:
+            keys.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.keys = keys
+        recipes = queryset.in_bulk([pk for _, pk in keys])
+        return [recipes[pk] for _, pk in keys if pk in recipes]
+
+    def decode_position(self, position):
+        date, _, pk = (position or '').rpartition('|')
+        try:
+            date, pk = parse_datetime(date), int(pk)
+        except ValueError:
+            date = None
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def link(self, key, reverse):
+        date, pk = key
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse, position=f'{date.isoformat()}|{pk}'
+        ))
+
+    def get_next_link(self):
+        if not self.has_next or not self.keys:
+            return None
+        return self.link(self.keys[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.keys:
+            return None
+        return self.link(self.keys[0], True)
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Курсорная пагинация подписок в порядке их оформления."""
+
+    ordering = ('-subscription_id',)
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class OptionalCursorPaginationMixin:
+    """Включает курсорную пагинацию по запросу клиента.
+
+    Курсорный режим выбирается параметром ``?pagination=cursor``,
+    а дальше поддерживается самим курсором в ссылках next/previous.
+    Без него используется обычная пагинация родительского класса.
+    """
+
+    cursor_pagination_class = None
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(CURSOR_SWITCH_PARAM)
+            == CURSOR_SWITCH_VALUE
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    @property
+    def cursor_query_param(self):
+        return self.cursor_pagination_class.cursor_query_param
+
+
+class RecipePagination(OptionalCursorPaginationMixin,
+                       EstimatedCountPageNumberPagination):
+    """Пагинация списка рецептов."""
+
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class SubscriptionPagination(OptionalCursorPaginationMixin,
+                             EstimatedCountLimitOffsetPagination):
+    """Пагинация списка подписок."""
+
+    cursor_pagination_class = SubscriptionCursorPagination
@@ -0,0 +1,81 @@
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+FONT_NAME = 'TimesNewRoman'
+FONT_PATH = settings.BASE_DIR / 'Fonts' / 'TimesNewRoman.ttf'
+FONT_SIZE = 10
+LEADING = 12
+MARGIN = inch
+BULLET = '•'
+
+
+class ShoppingListRenderer:
+    """Список покупок в PDF, нарисованный прямо на холсте.
+
+    Шрифт разбирается один раз на процесс. Строки списка выводятся
+    одним текстовым объектом на страницу, длинные переносятся по
+    ширине поля, при нехватке места начинается новая страница.
+    """
+
+    def __init__(self, pagesize=A4):
+        self.pagesize = pagesize
+        self.width = pagesize[0] - 2 * MARGIN
+        self.bullet = f'{BULLET} '
+        self.lock = threading.Lock()
+        self.font_registered = False
+
+    def register_font(self):
+        if not self.font_registered:
+            with self.lock:
+                if not self.font_registered:
+                    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+                    self.indent = pdfmetrics.stringWidth(
+                        self.bullet, FONT_NAME, FONT_SIZE
+                    )
+                    self.font_registered = True
+
+    def wrap(self, line):
+        """Строка с маркером, разбитая на куски по ширине поля."""
+        width = self.width - self.indent
+        if pdfmetrics.stringWidth(line, FONT_NAME, FONT_SIZE) <= width:
+            return [self.bullet + line]
+        parts = simpleSplit(line, FONT_NAME, FONT_SIZE, width) or ['']
+        return [self.bullet + parts[0]] + parts[1:]
+
+    def render(self, lines):
+        self.register_font()
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=self.pagesize)
+        top = self.pagesize[1] - MARGIN
+        text = None
+        for line in lines:
+            for number, part in enumerate(self.wrap(line)):
+                if text is None or text.getY() < MARGIN:
+                    if text is not None:
+                        canvas.drawText(text)
+                        canvas.showPage()
+                    text = canvas.beginText(MARGIN, top - FONT_SIZE)
+                    text.setFont(FONT_NAME, FONT_SIZE, LEADING)
+                    offset = 0
+                if offset != (self.indent if number else 0):
+                    shift = self.indent if number else -self.indent
+                    text.moveCursor(shift, 0)
+                    offset += shift
+                text.textLine(part)
+        if text is not None:
+            canvas.drawText(text)
+        canvas.showPage()
+        canvas.save()
+        buffer.seek(0)
+        return buffer
+
+
+shopping_list_renderer = ShoppingListRenderer()
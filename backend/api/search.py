@@ -0,0 +1,46 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .models import RecipeToIngredient
+
+SEARCH_CONFIG = 'russian'
+
+
+def recipe_search_vector():
+    """Вектор по названию, описанию и названиям ингредиентов рецепта."""
+    ingredient_names = Subquery(
+        RecipeToIngredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names'),
+        output_field=TextField(),
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredient_names, Value(''), output_field=TextField()),
+            weight='C',
+            config=SEARCH_CONFIG,
+        )
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчитывает поисковый вектор у выборки рецептов одним UPDATE."""
+    if connection.vendor != 'postgresql':
+        return
+    recipes.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, value):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-pub_date', '-id')
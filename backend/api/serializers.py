@@ -1,18 +1,22 @@
 import re
 
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueValidator
 
-from foodgram.const import MAX_LENGTH_EMAIL, MAX_LENGTH_SERIALIZERS
-from users.models import Favorite, ShoppingCart, Subscribe
+from foodgram.const import (BULK_MAX_SIZE, MAX_LENGTH_EMAIL,
+                            MAX_LENGTH_SERIALIZERS)
+from users.models import Favorite, ShoppingCart
 from .fields import Base64ImageField
+from .follows import get_follow_set
 from .models import Ingredient, Recipe, RecipeToIngredient, Tag
-from .utils import (get_is_subscribet_for_serizlizer,
-                    get_recipes_for_serializer, process_ingredients)
+from .utils import (add_to_shopping_totals, change_counter,
+                    get_is_subscribet_for_serizlizer,
+                    get_recipes_for_serializer, process_ingredients,
+                    subtract_from_shopping_totals)
 
 User = get_user_model()
 
@@ -88,10 +92,7 @@ class UserProfileSerializer(UserCreateSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj).exists()
+        return obj.pk in get_follow_set(self.context.get('request'))
 
     def to_representation(self, instance):
 
@@ -132,7 +133,7 @@ class UserProfileSerializerWithRecipes(serializers.ModelSerializer):
         ).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
         return get_is_subscribet_for_serizlizer(self, obj)
@@ -214,6 +215,9 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise ValidationError('Нужен хотя бы один ингредиент!')
 
         ingredients_set = set()
+        existing_ids = set(Ingredient.objects.filter(
+            id__in=[item.get('id') for item in value]
+        ).values_list('id', flat=True))
 
         for ingredient_data in value:
             ingredient_id = ingredient_data.get('id')
@@ -222,9 +226,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             if ingredient_id is None:
                 raise ValidationError('ID ингредиента не может быть пустым!')
 
-            try:
-                Ingredient.objects.get(id=ingredient_id)
-            except Exception:
+            if ingredient_id not in existing_ids:
                 raise ValidationError(
                     f'Ингредиент с ID {ingredient_id} не найден!'
                 )
@@ -258,31 +260,44 @@ class RecipeSerializer(serializers.ModelSerializer):
         request = self.context['request']
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        recipe = Recipe.objects.create(author=request.user, **validated_data)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=request.user, **validated_data
+            )
+            change_counter(
+                User.objects.filter(pk=request.user.pk), 'recipes_count', 1
+            )
 
-        if tags_data:
-            recipe.tags.set(tags_data)
+            if tags_data:
+                recipe.tags.set(tags_data)
 
-        if ingredients_data:
-            process_ingredients(recipe, ingredients_data)
+            if ingredients_data:
+                process_ingredients(recipe, ingredients_data)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        """Обновляет рецепт с ингредиентами.
+
+        Сохранение рецепта обновляет updated_at и ставит в очередь
+        пересчёт поискового вектора один раз на рецепт. Строки
+        ингредиентов меняются пачкой, без сигналов на каждую строку.
+        """
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
 
         instance = super().update(instance, validated_data)
 
-        instance.save()
-
         if tags_data is not None:
             instance.tags.set(tags_data)
 
         if ingredients_data is not None:
+            subtract_from_shopping_totals([instance.pk])
             RecipeToIngredient.objects.filter(recipe=instance).delete()
 
             process_ingredients(instance, ingredients_data)
+            add_to_shopping_totals([instance.pk])
 
         return instance
 
@@ -306,10 +321,7 @@ class UserRecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj).exists()
+        return obj.pk in get_follow_set(self.context.get('request'))
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
@@ -335,28 +347,30 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
         )
 
+    def to_representation(self, instance):
+        if not hasattr(instance, 'is_favorited'):
+            request = self.context.get('request')
+            instance = Recipe.objects.for_read(
+                request.user if request else None
+            ).get(pk=instance.pk)
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
-        ingredients = obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredient_list__amount'),
-        )
-        return ingredients
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredient_list.all()
+        ]
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request', None)
-        user = request.user if request else None
-        if user and user.is_authenticated:
-            return Favorite.objects.filter(user=user, recipe=obj).exists()
-        return False
+        return obj.is_favorited
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request', None)
-        user = request.user if request else None
-        if user and user.is_authenticated:
-            return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
-        return False
+        return obj.is_in_shopping_cart
 
 
 class RecipeShortReadSerializer(serializers.ModelSerializer):
@@ -393,42 +407,11 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         )
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
-    recipes = serializers.SerializerMethodField()
-    email = serializers.EmailField(source='author.email', read_only=True)
-    id = serializers.IntegerField(source='author.id', read_only=True)
-    username = serializers.CharField(source='author.username', read_only=True)
-    first_name = serializers.CharField(
-        source='author.first_name', read_only=True)
-    last_name = serializers.CharField(
-        source='author.last_name', read_only=True)
-    avatar = Base64ImageField(source='author.avatar', read_only=True)
-    is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для пакетных операций."""
 
-    class Meta:
-        model = Subscribe
-        fields = (
-            'email',
-            'id',
-            'username',
-            'first_name',
-            'last_name',
-            'avatar',
-            'is_subscribed',
-            'recipes',
-            'recipes_count'
-        )
-
-    def get_is_subscribed(self, obj):
-        user = self.context.get('current_user')
-        return Subscribe.objects.filter(
-            user=user, author=obj
-        ).exists() if user and user.is_authenticated else False
-
-    def get_recipes(self, obj):
-        recipes = get_recipes_for_serializer(self, obj)
-        return RecipeShortReadSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_SIZE,
+    )
@@ -0,0 +1,194 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .cache import RECIPES_VERSION_KEY, bump_version
+from .catalog import recipe_catalog
+from .feed import schedule_fan_out
+from .models import Ingredient, Recipe, Tag
+from .search import update_search_vectors
+from .suggest import INGREDIENT, RECIPE, USER, suggest_index
+from .snapshots import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
+from .utils import bump_cart_version, subtract_from_shopping_totals
+
+User = get_user_model()
+
+
+def bump_recipes_version():
+    recipe_catalog.expect(bump_version(RECIPES_VERSION_KEY))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_recipe_responses(sender, **kwargs):
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_responses_on_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_snapshot(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION_KEY))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_snapshot(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION_KEY))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipes_on_tags(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).touch()
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).touch()
+    else:
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Tag)
+def touch_recipes_on_tag(sender, instance, created, **kwargs):
+    if not created:
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_ingredient(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredient_list__ingredient=instance).touch()
+
+
+@receiver(post_save, sender=User)
+def touch_recipes_on_author(sender, instance, created, update_fields,
+                            **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    instance.recipes.touch()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_vectors_on_ingredient(sender, instance, created,
+                                        **kwargs):
+    if not created:
+        transaction.on_commit(lambda: update_search_vectors(
+            Recipe.objects.filter(ingredient_list__ingredient=instance)
+        ))
+
+
+SUGGEST_SOURCES = {
+    Recipe: (RECIPE, 'name'),
+    Ingredient: (INGREDIENT, 'name'),
+    User: (USER, 'username'),
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=User)
+def update_suggest_index(sender, instance, update_fields=None, **kwargs):
+    """Публикует новое название, если сохранение могло его изменить.
+
+    Сохранения только других полей, как last_login при входе, журнал
+    подсказок не засоряют.
+    """
+    kind, field = SUGGEST_SOURCES[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    text = getattr(instance, field)
+    transaction.on_commit(
+        lambda: suggest_index.update(kind, instance.pk, text)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    kind, _ = SUGGEST_SOURCES[sender]
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove(kind, pk))
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_catalog(sender, instance, created, **kwargs):
+    if recipe_catalog.state is None:
+        return
+    if created:
+        transaction.on_commit(
+            lambda: recipe_catalog.add(instance.pk, instance.author_id)
+        )
+    else:
+        transaction.on_commit(recipe_catalog.touch)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_catalog(sender, instance, **kwargs):
+    if recipe_catalog.state is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: recipe_catalog.remove(pk))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_catalog_tags(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_') or recipe_catalog.state is None:
+        return
+    if reverse:
+        transaction.on_commit(recipe_catalog.invalidate)
+        return
+    transaction.on_commit(lambda: recipe_catalog.set_tags(
+        instance.pk, set(instance.tags.values_list('slug', flat=True))
+    ))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_catalog_on_tag(sender, **kwargs):
+    if recipe_catalog.state is not None:
+        transaction.on_commit(recipe_catalog.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def invalidate_carts_on_recipe(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        bump_cart_version(User.objects.filter(shopping_cart__recipe=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_carts_on_ingredient(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        bump_cart_version(User.objects.filter(
+            shopping_cart__recipe__ingredient_list__ingredient=instance
+        ))
+
+
+@receiver(pre_delete, sender=Recipe)
+def subtract_deleted_recipe_from_totals(sender, instance, **kwargs):
+    subtract_from_shopping_totals([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
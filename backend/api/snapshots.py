@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_version
+from .models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+
+INGREDIENTS_VERSION_KEY = 'version:ingredients'
+TAGS_VERSION_KEY = 'version:tags'
+
+Snapshot = namedtuple('Snapshot', ('version', 'data', 'content', 'etag'))
+
+
+class CatalogSnapshot:
+    """Сериализованный справочник, хранящийся в памяти воркера.
+
+    Снимок неизменяем и целиком заменяется новым, когда в общем кэше
+    меняется версия справочника.
+    """
+
+    def __init__(self, queryset, serializer_class, version_key):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.version_key = version_key
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_version(self.version_key)
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version != version:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self.snapshot = self.build(version)
+        return snapshot
+
+    def build(self, version):
+        data = self.serializer_class(self.queryset.all(), many=True).data
+        content = JSONRenderer().render(data)
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        return Snapshot(version, tuple(data), content, etag)
+
+    def response(self, request):
+        """Ответ со снимком или 304, если у клиента он уже есть."""
+        snapshot = self.get()
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            response = HttpResponse(
+                snapshot.content, content_type='application/json'
+            )
+        response['ETag'] = snapshot.etag
+        return response
+
+
+tags_snapshot = CatalogSnapshot(
+    Tag.objects.order_by('id'), TagSerializer, TAGS_VERSION_KEY
+)
+ingredients_snapshot = CatalogSnapshot(
+    Ingredient.objects.order_by('id'),
+    IngredientSerializer,
+    INGREDIENTS_VERSION_KEY,
+)
+
+
+def tag_slug_choices():
+    """Варианты фильтра по тегам из снимка, без запроса к базе."""
+    return [(tag['slug'], tag['slug']) for tag in tags_snapshot.get().data]
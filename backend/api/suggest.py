@@ -0,0 +1,232 @@
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from foodgram.const import (SUGGEST_JOURNAL_MAX_LAG, SUGGEST_JOURNAL_TIMEOUT,
+                            SUGGEST_MAX_CANDIDATES, SUGGEST_THRESHOLD)
+from .cache import response_cache
+from .models import Ingredient, Recipe
+
+User = get_user_model()
+
+RECIPE = 'recipe'
+INGREDIENT = 'ingredient'
+USER = 'user'
+
+SEQUENCE_KEY = 'suggest:sequence'
+
+rebuild_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='suggest-rebuild'
+)
+
+
+def journal_key(number):
+    return f'suggest:journal:{number}'
+
+
+def trigrams(text):
+    """Триграммы слов строки, как их считает pg_trgm."""
+    result = set()
+    for word in text.casefold().split():
+        padded = f'  {word} '
+        result.update(
+            padded[index:index + 3] for index in range(len(padded) - 2)
+        )
+    return frozenset(result)
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм."""
+
+    def __init__(self):
+        self.documents = {}
+        self.postings = defaultdict(set)
+        self.lock = threading.RLock()
+
+    def add(self, key, text):
+        grams = trigrams(text)
+        with self.lock:
+            self.remove(key)
+            self.documents[key] = (text, grams)
+            for gram in grams:
+                self.postings[gram].add(key)
+
+    def remove(self, key):
+        with self.lock:
+            document = self.documents.pop(key, None)
+            if document is None:
+                return
+            for gram in document[1]:
+                posting = self.postings[gram]
+                posting.discard(key)
+                if not posting:
+                    del self.postings[gram]
+
+    def search(self, query, limit, threshold=SUGGEST_THRESHOLD):
+        """Документы, в которых нашлось больше всего триграмм запроса.
+
+        Оценка - доля триграмм запроса, найденных в документе, как у
+        word_similarity из pg_trgm; при равенстве выше документ, ближе
+        по сходству Жаккара. Документ с оценкой не ниже threshold
+        содержит хотя бы m = ceil(threshold * |q|) триграмм запроса,
+        поэтому кандидаты берутся из |q| - m + 1 самых редких списков.
+        Если их больше SUGGEST_MAX_CANDIDATES, остаются встреченные
+        в наибольшем числе этих списков, а из них - самые короткие,
+        и только их оценка проверяется точно.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        with self.lock:
+            postings = sorted(
+                (self.postings.get(gram, ()) for gram in grams), key=len
+            )
+            required = max(math.ceil(threshold * len(grams)), 1)
+            hits = Counter()
+            for posting in postings[:len(grams) - required + 1]:
+                hits.update(posting)
+            candidates = hits
+            if len(hits) > SUGGEST_MAX_CANDIDATES:
+                candidates = heapq.nsmallest(
+                    SUGGEST_MAX_CANDIDATES,
+                    hits,
+                    key=lambda key: (-hits[key], len(self.documents[key][1])),
+                )
+            scored = []
+            for key in candidates:
+                text, document_grams = self.documents[key]
+                shared = len(grams & document_grams)
+                if shared < required:
+                    continue
+                scored.append((
+                    shared / len(grams),
+                    shared / (len(grams) + len(document_grams) - shared),
+                    key,
+                    text,
+                ))
+        return [
+            (key, text, score)
+            for score, _, key, text in heapq.nlargest(limit, scored)
+        ]
+
+
+class SuggestIndex:
+    """Подсказки по рецептам, ингредиентам и авторам в памяти воркера.
+
+    Первое обращение запускает сборку индекса в фоновом потоке, до её
+    окончания подсказки пусты. Изменения пишутся в журнал
+    в общем кэше под возрастающими номерами, и перед поиском каждый
+    воркер докатывает на свой индекс записи, которых ещё не видел.
+    Полная пересборка нужна, только если журнал отстал больше чем на
+    SUGGEST_JOURNAL_MAX_LAG записей, его записи истекли или номер
+    сбросился. Она идёт в фоновом потоке, а запросы тем временем
+    обслуживает прежний индекс.
+    """
+
+    sources = (
+        (RECIPE, Recipe, 'name'),
+        (INGREDIENT, Ingredient, 'name'),
+        (USER, User, 'username'),
+    )
+
+    def __init__(self):
+        self.index = None
+        self.applied = 0
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    def get_index(self):
+        if self.index is None:
+            self.schedule_rebuild()
+            return TrigramIndex()
+        self.catch_up()
+        return self.index
+
+    def build(self):
+        """Индекс из базы и номер журнала, с которого его докатывать."""
+        sequence = response_cache.get(SEQUENCE_KEY, 0)
+        index = TrigramIndex()
+        for kind, model, field in self.sources:
+            for pk, text in model.objects.values_list('pk', field).iterator():
+                index.add((kind, pk), text)
+        return index, sequence
+
+    def catch_up(self):
+        sequence = response_cache.get(SEQUENCE_KEY, 0)
+        if sequence == self.applied or self.rebuilding:
+            return
+        if (
+            sequence < self.applied
+            or sequence - self.applied > SUGGEST_JOURNAL_MAX_LAG
+        ):
+            self.schedule_rebuild()
+            return
+        with self.lock:
+            numbers = range(self.applied + 1, sequence + 1)
+            entries = response_cache.get_many(map(journal_key, numbers))
+            for number in numbers:
+                entry = entries.get(journal_key(number))
+                if entry is None:
+                    self.schedule_rebuild()
+                    return
+                self.apply(*entry)
+                self.applied = number
+
+    def apply(self, kind, pk, text):
+        if text is None:
+            self.index.remove((kind, pk))
+        else:
+            self.index.add((kind, pk), text)
+
+    def schedule_rebuild(self):
+        if not self.rebuilding:
+            self.rebuilding = True
+            rebuild_executor.submit(self.rebuild)
+
+    def load(self):
+        index, sequence = self.build()
+        with self.lock:
+            self.index, self.applied = index, sequence
+
+    def rebuild(self):
+        close_old_connections()
+        try:
+            self.load()
+        finally:
+            self.rebuilding = False
+            close_old_connections()
+
+    def publish(self, kind, pk, text):
+        """Пишет изменение в журнал и сразу применяет его у себя."""
+        try:
+            number = response_cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            response_cache.add(SEQUENCE_KEY, 0, None)
+            number = response_cache.incr(SEQUENCE_KEY)
+        response_cache.set(
+            journal_key(number), (kind, pk, text), SUGGEST_JOURNAL_TIMEOUT
+        )
+        if self.index is not None:
+            self.apply(kind, pk, text)
+
+    def update(self, kind, pk, text):
+        self.publish(kind, pk, text)
+
+    def remove(self, kind, pk):
+        self.publish(kind, pk, None)
+
+    def suggest(self, query, limit):
+        return [
+            {'type': kind, 'id': pk, 'name': text, 'score': round(score, 3)}
+            for (kind, pk), text, score in self.get_index().search(
+                query, limit
+            )
+        ]
+
+
+suggest_index = SuggestIndex()
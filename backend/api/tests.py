@@ -0,0 +1,775 @@
+import base64
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db.models import Sum
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from foodgram.const import BULK_MAX_SIZE
+
+from users.models import Favorite, ShoppingCart, ShoppingTotal, Subscribe
+from .cache import RECIPES_VERSION_KEY, bump_version
+from .catalog import recipe_catalog
+from .feed import fill_timelines
+from .models import Ingredient, Recipe, RecipeToIngredient, Tag, TimelineEntry
+from .suggest import (RECIPE, SEQUENCE_KEY, SuggestIndex, TrigramIndex,
+                      journal_key)
+from .utils import add_to_shopping_totals, encode_short_code
+
+User = get_user_model()
+
+GIF = base64.b64decode(
+    'R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw=='
+)
+MEDIA_ROOT = tempfile.mkdtemp()
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+TEST_CACHES = {
+    'default': {'BACKEND': LOCMEM, 'LOCATION': 'foodgram-tests-default'},
+    'responses': {
+        'BACKEND': LOCMEM,
+        'LOCATION': 'foodgram-tests-responses',
+        'TIMEOUT': None,
+    },
+}
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, RECIPE_CATALOG_ENGINE=False, CACHES=TEST_CACHES
+)
+class FoodgramTestCase(APITestCase):
+    """Пользователи, теги и ингредиенты для тестов API.
+
+    Кэши подменены на локальные в памяти, чтобы тесты не очищали
+    общий кэш работающего приложения.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pw'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.clear_caches()
+        self.client.force_authenticate(self.user)
+
+    def clear_caches(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def request(self, method, url, expected_queries, expected_status):
+        with self.assertNumQueries(expected_queries):
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def create_recipe(self, author=None, name='Рецепт'):
+        author = author or self.author
+        recipe = Recipe(
+            author=author, name=name, text='Текст', cooking_time=5
+        )
+        recipe.image.save('recipe.gif', ContentFile(GIF), save=False)
+        recipe.save()
+        recipe.tags.set(self.tags)
+        RecipeToIngredient.objects.bulk_create(
+            RecipeToIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in self.ingredients
+        )
+        return recipe
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """Число запросов списка рецептов не зависит от размера страницы.
+
+    На тёплом кэше фрагментов страница - это запрос страницы и
+    ограниченный подсчёт, а анонимный список целиком отдаётся из кэша.
+    """
+
+    AUTHENTICATED_QUERIES = 6
+    ANONYMOUS_QUERIES = 5
+    WARM_AUTHENTICATED_QUERIES = 2
+    WARM_ANONYMOUS_QUERIES = 0
+    WARM_DETAIL_QUERIES = 1
+
+    def assert_constant_queries(self, expected, warm_expected):
+        for count in (1, 6):
+            while Recipe.objects.count() < count:
+                self.create_recipe()
+            self.clear_caches()
+            for queries in (expected, warm_expected):
+                with self.assertNumQueries(queries):
+                    response = self.client.get('/api/recipes/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), count)
+
+    def test_authenticated_list(self):
+        self.assert_constant_queries(
+            self.AUTHENTICATED_QUERIES, self.WARM_AUTHENTICATED_QUERIES
+        )
+
+    def test_anonymous_list(self):
+        self.client.force_authenticate(None)
+        self.assert_constant_queries(
+            self.ANONYMOUS_QUERIES, self.WARM_ANONYMOUS_QUERIES
+        )
+
+    def test_warm_detail(self):
+        url = f'/api/recipes/{self.create_recipe().pk}/'
+        self.client.get(url)
+        self.request('get', url, self.WARM_DETAIL_QUERIES, 200)
+
+
+class ToggleQueriesMixin:
+    """Запросы и ответы переключателя избранного или корзины.
+
+    В числе запросов учтены SAVEPOINT и RELEASE транзакции записи.
+    """
+
+    model = None
+    path = None
+    counter = None
+    ADD_QUERIES = None
+    REMOVE_QUERIES = None
+    REJECT_QUERIES = 4
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        self.url = f'/api/recipes/{self.recipe.pk}/{self.path}/'
+
+    def counter_value(self):
+        return Recipe.objects.values_list(self.counter, flat=True).get(
+            pk=self.recipe.pk
+        )
+
+    def test_add(self):
+        response = self.request('post', self.url, self.ADD_QUERIES, 201)
+        self.assertEqual(response.data['name'], self.recipe.name)
+        self.assertTrue(self.model.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        self.assertEqual(self.counter_value(), 1)
+
+    def test_add_existing(self):
+        """Строку уже вставил параллельный запрос: счётчик не трогаем."""
+        self.model.objects.create(user=self.user, recipe=self.recipe)
+        self.request('post', self.url, self.REJECT_QUERIES, 400)
+        self.assertEqual(self.counter_value(), 0)
+
+    def test_add_missing_recipe(self):
+        self.request(
+            'post', f'/api/recipes/0/{self.path}/', self.REJECT_QUERIES, 404
+        )
+
+    def test_remove(self):
+        self.client.post(self.url)
+        self.request('delete', self.url, self.REMOVE_QUERIES, 204)
+        self.assertFalse(self.model.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        self.assertEqual(self.counter_value(), 0)
+
+    def test_remove_absent(self):
+        self.request('delete', self.url, self.REJECT_QUERIES, 400)
+
+    def test_remove_missing_recipe(self):
+        self.request(
+            'delete', f'/api/recipes/0/{self.path}/', self.REJECT_QUERIES, 404
+        )
+
+
+class FavoriteToggleTest(ToggleQueriesMixin, FoodgramTestCase):
+    model = Favorite
+    path = 'favorite'
+    counter = 'favorites_count'
+    ADD_QUERIES = 4
+    REMOVE_QUERIES = 4
+
+
+class ShoppingCartToggleTest(ToggleQueriesMixin, FoodgramTestCase):
+    model = ShoppingCart
+    path = 'shopping_cart'
+    counter = 'in_carts_count'
+    ADD_QUERIES = 6
+    REMOVE_QUERIES = 7
+
+    def totals(self):
+        return dict(ShoppingTotal.objects.filter(user=self.user).values_list(
+            'ingredient_id', 'total_amount'
+        ))
+
+    def test_add_updates_totals(self):
+        self.client.post(self.url)
+        self.client.post(self.url)
+        self.assertEqual(self.totals(), {
+            ingredient.pk: 10 for ingredient in self.ingredients
+        })
+
+    def test_remove_updates_totals(self):
+        self.client.post(self.url)
+        self.client.delete(self.url)
+        self.client.delete(self.url)
+        self.assertEqual(self.totals(), {})
+
+    def test_ingredient_delete_invalidates_carts(self):
+        self.client.post(self.url)
+        User.objects.filter(pk=self.author.pk).update(cart_version=7)
+        self.ingredients[0].delete()
+        self.assertEqual(
+            dict(User.objects.filter(
+                pk__in=[self.user.pk, self.author.pk]
+            ).values_list('pk', 'cart_version')),
+            {self.user.pk: 2, self.author.pk: 7},
+        )
+        self.assertNotIn(self.ingredients[0].pk, self.totals())
+
+
+class SubscribeToggleTest(FoodgramTestCase):
+    """Подписка и отписка, включая SAVEPOINT и RELEASE транзакции."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipe()
+        self.url = f'/api/users/{self.author.pk}/subscribe/'
+
+    def followers(self):
+        return User.objects.values_list('followers_count', flat=True).get(
+            pk=self.author.pk
+        )
+
+    def test_subscribe(self):
+        response = self.request('post', self.url, 8, 201)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(self.followers(), 1)
+
+    def test_subscribe_existing(self):
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.request('post', self.url, 4, 400)
+        self.assertEqual(self.followers(), 0)
+
+    def test_subscribe_missing_author(self):
+        self.request('post', '/api/users/0/subscribe/', 4, 404)
+
+    def test_subscribe_self(self):
+        self.request('post', f'/api/users/{self.user.pk}/subscribe/', 0, 400)
+
+    def test_unsubscribe(self):
+        self.client.post(self.url)
+        self.request('delete', self.url, 5, 204)
+        self.assertEqual(self.followers(), 0)
+
+    def test_unsubscribe_absent(self):
+        self.request('delete', self.url, 4, 400)
+
+    def test_unsubscribe_missing_author(self):
+        self.request('delete', '/api/users/0/subscribe/', 4, 404)
+
+
+class BulkOperationsTest(FoodgramTestCase):
+    """Пакетные операции: статусы, предел пачки, счётчики и итоги.
+
+    Пакетная подписка - это вставка подписок, пересчёт подписчиков,
+    один INSERT ... SELECT в ленты и одна обрезка лент, плюс SAVEPOINT
+    и RELEASE.
+    """
+
+    MISSING = 10 ** 6
+    SUBSCRIBE_QUERIES = 6
+
+    def setUp(self):
+        super().setUp()
+        self.authors = [self.author] + [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='pw',
+            )
+            for number in range(3)
+        ]
+        self.recipes = [self.create_recipe(author) for author in self.authors]
+
+    def bulk(self, method, url, ids, expected_status=200):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def statuses(self, response):
+        return [
+            (result['id'], result['status'])
+            for result in response.data['results']
+        ]
+
+    def values(self, model, field, objects):
+        return list(model.objects.filter(
+            pk__in=[obj.pk for obj in objects]
+        ).order_by('pk').values_list(field, flat=True))
+
+    def test_subscribe(self):
+        Subscribe.objects.create(user=self.user, author=self.authors[0])
+        ids = [
+            self.authors[0].pk, self.authors[1].pk, self.user.pk,
+            self.MISSING, self.authors[2].pk, self.authors[1].pk,
+        ]
+        response = self.bulk('post', '/api/users/subscribe/', ids)
+        self.assertEqual(self.statuses(response), [
+            (self.authors[0].pk, 'exists'),
+            (self.authors[1].pk, 'created'),
+            (self.user.pk, 'self'),
+            (self.MISSING, 'not_found'),
+            (self.authors[2].pk, 'created'),
+        ])
+        self.assertEqual(
+            self.values(User, 'followers_count', self.authors), [0, 1, 1, 0]
+        )
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )),
+            {self.recipes[1].pk, self.recipes[2].pk},
+        )
+
+    def test_subscribe_queries_do_not_grow_with_batch(self):
+        ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(self.SUBSCRIBE_QUERIES):
+            self.bulk('post', '/api/users/subscribe/', ids[:1])
+        with self.assertNumQueries(self.SUBSCRIBE_QUERIES):
+            self.bulk('post', '/api/users/subscribe/', ids[1:])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(),
+            len(self.recipes),
+        )
+
+    def test_unsubscribe(self):
+        ids = [author.pk for author in self.authors[:2]]
+        self.bulk('post', '/api/users/subscribe/', ids)
+        response = self.bulk(
+            'delete', '/api/users/subscribe/', [ids[0], self.MISSING]
+        )
+        self.assertEqual(self.statuses(response), [
+            (ids[0], 'deleted'), (self.MISSING, 'missing'),
+        ])
+        self.assertEqual(
+            self.values(User, 'followers_count', self.authors), [0, 1, 0, 0]
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )),
+            [self.recipes[1].pk],
+        )
+
+    def test_favorite(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ids = [self.recipes[0].pk, self.recipes[1].pk, self.MISSING]
+        response = self.bulk('post', '/api/recipes/favorite/', ids)
+        self.assertEqual(self.statuses(response), [
+            (ids[0], 'exists'), (ids[1], 'created'),
+            (self.MISSING, 'not_found'),
+        ])
+        self.assertEqual(
+            self.values(Recipe, 'favorites_count', self.recipes),
+            [0, 1, 0, 0],
+        )
+        response = self.bulk(
+            'delete', '/api/recipes/favorite/', [ids[1], ids[2]]
+        )
+        self.assertEqual(self.statuses(response), [
+            (ids[1], 'deleted'), (self.MISSING, 'missing'),
+        ])
+        self.assertEqual(
+            self.values(Recipe, 'favorites_count', self.recipes),
+            [0, 0, 0, 0],
+        )
+
+    def test_shopping_cart_totals(self):
+        ids = [recipe.pk for recipe in self.recipes]
+        response = self.bulk('post', '/api/recipes/shopping_cart/', ids)
+        self.assertEqual(
+            self.statuses(response), [(pk, 'created') for pk in ids]
+        )
+        self.assertEqual(
+            self.values(Recipe, 'in_carts_count', self.recipes), [1] * 4
+        )
+        self.assertEqual(self.totals(), {
+            ingredient.pk: 40 for ingredient in self.ingredients
+        })
+        self.bulk('delete', '/api/recipes/shopping_cart/', ids[:3])
+        self.assertEqual(
+            self.values(Recipe, 'in_carts_count', self.recipes),
+            [0, 0, 0, 1],
+        )
+        self.assertEqual(self.totals(), {
+            ingredient.pk: 10 for ingredient in self.ingredients
+        })
+
+    def totals(self):
+        return dict(ShoppingTotal.objects.filter(user=self.user).values_list(
+            'ingredient_id', 'total_amount'
+        ))
+
+    def test_batch_size_is_capped(self):
+        for ids in ([], list(range(1, BULK_MAX_SIZE + 2))):
+            for url in (
+                '/api/users/subscribe/',
+                '/api/recipes/favorite/',
+                '/api/recipes/shopping_cart/',
+            ):
+                self.bulk('post', url, ids, 400)
+        self.assertFalse(Subscribe.objects.exists())
+        self.assertFalse(Favorite.objects.exists())
+        self.assertFalse(ShoppingCart.objects.exists())
+
+
+class SubscriptionListQueriesTest(FoodgramTestCase):
+    """Число запросов списка подписок не зависит от числа авторов.
+
+    Подсчёт, страница авторов и последние рецепты всех авторов
+    страницы одним запросом - и с recipes_limit, и без него.
+    """
+
+    QUERIES = 3
+
+    def setUp(self):
+        super().setUp()
+        self.authors = [self.author] + [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='pw',
+            )
+            for number in range(2)
+        ]
+        for author in self.authors:
+            for number in range(3):
+                self.create_recipe(author, f'{author.username} {number}')
+
+    def test_constant_queries(self):
+        for count in (1, len(self.authors)):
+            for author in self.authors[:count]:
+                Subscribe.objects.get_or_create(user=self.user, author=author)
+            for query, recipes in (('', 3), ('?recipes_limit=2', 2)):
+                with self.subTest(authors=count, query=query):
+                    self.clear_caches()
+                    with self.assertNumQueries(self.QUERIES):
+                        response = self.client.get(
+                            f'/api/users/subscriptions/{query}'
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), count)
+                    for author in response.data['results']:
+                        self.assertEqual(len(author['recipes']), recipes)
+
+
+class RecipeDetailConditionalTest(FoodgramTestCase):
+    """Условный GET рецепта учитывает флаги пользователя."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_favorite_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(f'{self.url}favorite/')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_if_modified_since_is_ignored(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class RecipeUpdateQueriesTest(FoodgramTestCase):
+    """Число запросов PATCH не растёт с числом ингредиентов."""
+
+    UPDATE_QUERIES = 20
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.recipe = self.create_recipe()
+        self.extra_ingredients = [
+            Ingredient.objects.create(
+                name=f'Добавка {number}', measurement_unit='г'
+            )
+            for number in range(20)
+        ]
+
+    def patch(self, ingredients):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 5}
+                    for ingredient in ingredients
+                ],
+                'tags': [tag.pk for tag in self.tags],
+                'image': 'data:image/gif;base64,'
+                + base64.b64encode(GIF).decode(),
+                'name': 'Новое название',
+                'text': 'Текст',
+                'cooking_time': 3,
+            },
+            format='json',
+        )
+
+    def test_update_queries(self):
+        for ingredients in (
+            self.ingredients[:1], self.ingredients + self.extra_ingredients
+        ):
+            self.clear_caches()
+            with self.assertNumQueries(self.UPDATE_QUERIES):
+                response = self.patch(ingredients)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                self.recipe.ingredient_list.count(), len(ingredients)
+            )
+
+    def test_update_touches_recipe(self):
+        updated_at = self.recipe.updated_at
+        self.patch(self.ingredients)
+        self.recipe.refresh_from_db()
+        self.assertGreater(self.recipe.updated_at, updated_at)
+
+    def test_update_keeps_cart_totals(self):
+        """Дельта по корзинам совпадает со свежей агрегацией."""
+        buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pw'
+        )
+        other = self.create_recipe(name='Другой')
+        carts = {self.user: [self.recipe, other], buyer: [self.recipe]}
+        for user, recipes in carts.items():
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+            )
+            add_to_shopping_totals([recipe.pk for recipe in recipes], user.pk)
+        response = self.patch(
+            self.ingredients[1:] + self.extra_ingredients[:2]
+        )
+        self.assertEqual(response.status_code, 200)
+        for user in carts:
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    dict(ShoppingTotal.objects.filter(
+                        user=user
+                    ).values_list('ingredient_id', 'total_amount')),
+                    dict(RecipeToIngredient.objects.filter(
+                        recipe__shopping_cart__user=user
+                    ).values('ingredient_id').annotate(
+                        total=Sum('amount')
+                    ).values_list('ingredient_id', 'total')),
+                )
+
+
+class SuggestJournalTest(FoodgramTestCase):
+    """Воркеры докатывают изменения из журнала без пересборки."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(name='Борщ')
+        self.writer = SuggestIndex()
+        self.reader = SuggestIndex()
+        self.writer.load()
+        self.reader.load()
+
+    def names(self, index, query):
+        return [item['name'] for item in index.suggest(query, 5)]
+
+    def test_update_reaches_other_worker(self):
+        self.writer.update(RECIPE, self.recipe.pk, 'Солянка')
+        self.assertEqual(self.names(self.writer, 'солянка'), ['Солянка'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(self.reader, 'солянка'), ['Солянка'])
+        self.assertEqual(self.names(self.reader, 'борщ'), [])
+
+    def test_remove_reaches_other_worker(self):
+        self.writer.remove(RECIPE, self.recipe.pk)
+        self.assertEqual(self.names(self.reader, 'борщ'), [])
+
+    def test_expired_entry_schedules_rebuild(self):
+        self.writer.update(RECIPE, self.recipe.pk, 'Солянка')
+        caches['responses'].delete(journal_key(self.reader.applied + 1))
+        self.reader.schedule_rebuild = lambda: setattr(
+            self.reader, 'rebuilding', True
+        )
+        self.assertEqual(self.names(self.reader, 'борщ'), ['Борщ'])
+        self.assertTrue(self.reader.rebuilding)
+
+    def test_first_call_does_not_build_in_request(self):
+        index = SuggestIndex()
+        index.schedule_rebuild = mock.Mock()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(index, 'борщ'), [])
+        index.schedule_rebuild.assert_called_once_with()
+
+    def test_login_does_not_touch_journal(self):
+        sequence = caches['responses'].get(SEQUENCE_KEY, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(caches['responses'].get(SEQUENCE_KEY, 0), sequence)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['username'])
+        self.assertEqual(
+            caches['responses'].get(SEQUENCE_KEY, 0), sequence + 1
+        )
+
+
+class TrigramIndexTest(SimpleTestCase):
+    """Ограничение числа кандидатов не отбрасывает лучшее совпадение."""
+
+    def test_exact_match_among_many_similar(self):
+        index = TrigramIndex()
+        for number in range(20000):
+            index.add((RECIPE, number), f'борщ украинский {number}')
+        index.add((RECIPE, -1), 'Борщ')
+        results = index.search('борщ', 5)
+        self.assertEqual(results[0][:2], ((RECIPE, -1), 'Борщ'))
+
+
+class ShortLinkTest(FoodgramTestCase):
+    """Короткая ссылка ведёт на рецепт, пока он существует."""
+
+    def test_redirect_and_delete(self):
+        recipe = self.create_recipe()
+        url = f'/s/{encode_short_code(recipe.pk)}/'
+        response = self.request('get', url, 1, 302)
+        self.assertEqual(response['Location'], f'/recipes/{recipe.pk}/')
+        recipe.delete()
+        self.request('get', url, 1, 404)
+
+    def test_invalid_code(self):
+        self.request('get', '/s/-/', 0, 404)
+
+
+class FeedTest(FoodgramTestCase):
+    """Лента читается по ключу из таблицы ленты и от крупных авторов."""
+
+    FEED_QUERIES = 7
+
+    def setUp(self):
+        super().setUp()
+        self.big_author = User.objects.create_user(
+            username='star', email='star@example.com', password='pw'
+        )
+        self.recipes = []
+        for number in range(3):
+            self.recipes.append(
+                self.create_recipe(self.author, f'Лента {number}')
+            )
+            self.recipes.append(
+                self.create_recipe(self.big_author, f'Звезда {number}')
+            )
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        User.objects.filter(pk=self.big_author.pk).update(followers_count=5)
+        Subscribe.objects.create(user=self.user, author=self.big_author)
+        self.patch = mock.patch('api.feed.FEED_FANOUT_MAX_FOLLOWERS', 1)
+        self.patch.start()
+        self.addCleanup(self.patch.stop)
+
+    def names(self, response):
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_timeline_filled_on_subscribe(self):
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.user).values_list(
+                'recipe__author', flat=True
+            )),
+            {self.author.pk},
+        )
+
+    def test_pages_merge_timeline_and_big_authors(self):
+        newest_first = [recipe.name for recipe in reversed(self.recipes)]
+        response = self.client.get('/api/recipes/feed/?limit=4')
+        self.assertEqual(self.names(response), newest_first[:4])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.names(response), newest_first[4:])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(self.names(response), newest_first[:4])
+        self.assertIsNone(response.data['previous'])
+
+    def test_constant_queries(self):
+        for limit in (1, 5):
+            self.clear_caches()
+            with self.assertNumQueries(self.FEED_QUERIES):
+                response = self.client.get(f'/api/recipes/feed/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/feed/?cursor=bad')
+        self.assertEqual(response.status_code, 404)
+
+    def test_fill_timelines_restores_lost_fan_out(self):
+        TimelineEntry.objects.all().delete()
+        self.assertEqual(fill_timelines(Subscribe.objects.all()), 3)
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+
+
+@override_settings(RECIPE_CATALOG_ENGINE=True)
+class RecipeCatalogTest(FoodgramTestCase):
+    """Снимок каталога следует версии рецептов из общего кэша."""
+
+    def setUp(self):
+        super().setUp()
+        recipe_catalog.invalidate()
+        self.addCleanup(recipe_catalog.invalidate)
+        self.create_recipe(name='Первый')
+        recipe_catalog.get_state()
+
+    def listed(self):
+        response = self.client.get(
+            f'/api/recipes/?tags={self.tags[0].slug}'
+        )
+        return response.data['count'], [
+            recipe['name'] for recipe in response.data['results']
+        ]
+
+    def test_other_worker_write_rebuilds_snapshot(self):
+        self.create_recipe(name='Второй')
+        bump_version(RECIPES_VERSION_KEY)
+        self.assertEqual(self.listed(), (2, ['Второй', 'Первый']))
+
+    def test_own_write_is_applied_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe(name='Второй')
+        with self.assertNumQueries(0):
+            state = recipe_catalog.get_state()
+        self.assertEqual(state.ids[0], recipe.pk)
+        self.assertTrue(state.tags[self.tags[0].slug][0])
+        self.assertEqual(self.listed(), (2, ['Второй', 'Первый']))
@@ -1,108 +1,439 @@
 from collections import defaultdict
-from io import BytesIO
 
-import pyshorteners
-from django.db.models import Sum
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import (Count, F, IntegerField, OuterRef, Subquery,
+                              Sum, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph, SimpleDocTemplate
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from users.models import Subscribe
+from foodgram.const import SHORT_LINK_ALPHABET, SHORT_LINK_MAX_LENGTH
+from users.models import Favorite, ShoppingCart, ShoppingTotal, Subscribe
+from .feed import fill_timelines, remove_authors_from_timeline
+from .follows import get_follow_set, invalidate_follow_set
 from .models import Recipe, RecipeToIngredient
+from .pdf import shopping_list_renderer
 
-DOT_SYMBOL = u'\u2022'
+LIST_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
 
+User = get_user_model()
 
-def generate_shopping_list(recipes):
-    recipe_ids = [recipe.get('recipe_id') for recipe in recipes.values()]
 
-    ingredient_data = RecipeToIngredient.objects.filter(
-        recipe__in=recipe_ids).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(total_amount=Sum('amount'))
+def change_counter(queryset, field, delta):
+    """Атомарно сдвигает счётчик у всех объектов выборки."""
+    queryset.update(**{field: F(field) + delta})
 
-    ingredients_dict = defaultdict(lambda: defaultdict(int))
 
-    for item in ingredient_data:
-        name = item['ingredient__name']
-        unit = item['ingredient__measurement_unit']
-        amount = item['total_amount']
-        ingredients_dict[name][unit] += amount
+def count_subquery(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
 
-    formatted_ingredients = []
 
-    for name, units in ingredients_dict.items():
-        for unit, amount in units.items():
-            ingredient_line = f'{DOT_SYMBOL} {name} {amount} {unit}\n'
-            formatted_ingredients.append(ingredient_line)
+def bump_cart_version(users):
+    """Делает устаревшими сохранённые списки покупок пользователей."""
+    change_counter(users, 'cart_version', 1)
 
-    buffer = BytesIO()
-    pdf_file = SimpleDocTemplate(buffer, pagesize=A4)
 
-    styles = getSampleStyleSheet()
-    normal_style = styles['Normal']
-    pdfmetrics.registerFont(TTFont('TimesNewRoman', 'Fonts/TimesNewRoman.ttf'))
-    normal_style.fontName = 'TimesNewRoman'
+def shopping_list_items(user):
+    """Суммарное количество каждого ингредиента в корзине пользователя."""
+    return ShoppingTotal.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+    ).order_by('ingredient__name')
+
+
+def add_to_shopping_totals(recipe_ids, user_id=None):
+    """Прибавляет ингредиенты рецептов к суммам корзин, где они лежат.
+
+    Без user_id затрагиваются все корзины с этими рецептами. Суммы
+    обновляются одним INSERT ... ON CONFLICT DO UPDATE.
+    """
+    quote = connection.ops.quote_name
+    totals = quote(ShoppingTotal._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    sql = (
+        f'INSERT INTO {totals} (user_id, ingredient_id, total_amount) '
+        f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+        f'FROM {quote(ShoppingCart._meta.db_table)} cart '
+        f'JOIN {quote(RecipeToIngredient._meta.db_table)} item '
+        f'ON item.recipe_id = cart.recipe_id '
+        f'WHERE cart.recipe_id IN ({placeholders})'
+    )
+    params = list(recipe_ids)
+    if user_id is not None:
+        sql += ' AND cart.user_id = %s'
+        params.append(user_id)
+    sql += (
+        ' GROUP BY cart.user_id, item.ingredient_id'
+        ' ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+        f'SET total_amount = {totals}.total_amount + EXCLUDED.total_amount'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def subtract_from_shopping_totals(recipe_ids, user_id=None):
+    """Вычитает ингредиенты рецептов из сумм корзин.
+
+    С user_id вычитаются все рецепты, поэтому вызов идёт после
+    удаления их из корзины пользователя. Без user_id затрагиваются
+    корзины, где рецепты ещё лежат, так что вызов должен идти до
+    удаления строк корзины. Обнулившиеся суммы удаляются.
+    """
+    items = RecipeToIngredient.objects.filter(
+        recipe_id__in=recipe_ids, ingredient_id=OuterRef('ingredient_id')
+    )
+    if user_id is not None:
+        users = [user_id]
+    else:
+        users = ShoppingCart.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('user_id')
+        items = items.filter(recipe__shopping_cart__user=OuterRef('user_id'))
+    totals = ShoppingTotal.objects.filter(
+        user__in=users,
+        ingredient__in=RecipeToIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id'),
+    )
+    totals.update(total_amount=F('total_amount') - Coalesce(
+        Subquery(
+            items.order_by().values('ingredient_id')
+            .annotate(total=Sum('amount')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    ))
+    totals.filter(total_amount=0).delete()
+
+
+def generate_shopping_list(user):
+    return shopping_list_renderer.render(
+        f'{name} {amount} {unit}'
+        for name, unit, amount in shopping_list_items(user)
+    )
+
+
+def encode_short_code(number):
+    """Код base62 для положительного числа."""
+    base = len(SHORT_LINK_ALPHABET)
+    code = []
+    while True:
+        number, digit = divmod(number, base)
+        code.append(SHORT_LINK_ALPHABET[digit])
+        if not number:
+            return ''.join(reversed(code))
 
-    paragraphs = [
-        Paragraph(line, normal_style) for line in formatted_ingredients
-    ]
-    pdf_file.build(paragraphs)
-    buffer.seek(0)
-    return buffer
 
+def decode_short_code(code):
+    """Число по коду base62 или None, если код некорректен."""
+    base = len(SHORT_LINK_ALPHABET)
+    if not code or len(code) > SHORT_LINK_MAX_LENGTH:
+        return None
+    number = 0
+    for char in code:
+        digit = SHORT_LINK_ALPHABET.find(char)
+        if digit < 0:
+            return None
+        number = number * base + digit
+    return number
 
-def create_short_link(full_link):
-    shortener = pyshorteners.Shortener()
-    return shortener.tinyurl.short(full_link)
+
+def resolve_short_code(code):
+    """Путь к рецепту по короткому коду.
+
+    Разбор кода стоит дешевле любого кэша, а наличие рецепта
+    проверяется одним запросом по первичному ключу, чтобы ссылка
+    на удалённый рецепт сразу давала Http404.
+    """
+    recipe_id = decode_short_code(code)
+    if recipe_id is None or not Recipe.objects.filter(pk=recipe_id).exists():
+        raise Http404
+    return f'/recipes/{recipe_id}/'
+
+
+def create_short_link(request, recipe_id):
+    """Короткая ссылка вычисляется из id рецепта и ничего не хранит."""
+    return request.build_absolute_uri(
+        f'/s/{encode_short_code(recipe_id)}/'
+    )
+
+
+def latest_recipes(author_ids, limit=None):
+    """Последние рецепты авторов, не больше limit на автора.
+
+    Все авторы обрабатываются одним запросом: рецепты нумеруются
+    оконной функцией ROW_NUMBER() в разрезе автора, а отбор по номеру
+    идёт во внешнем запросе, потому что фильтровать по окну ORM
+    не умеет.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        sql, params = recipes.annotate(position=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).order_by().values('id', 'position').query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.position <= %s',
+            (*params, limit),
+        ))
+    by_author = defaultdict(list)
+    for recipe in recipes.only(
+        'id', 'author_id', 'name', 'image', 'cooking_time'
+    ).order_by('-pub_date', '-id'):
+        by_author[recipe.author_id].append(recipe)
+    return by_author
 
 
 def get_recipes_for_serializer(self, obj):
-    recipes = Recipe.objects.filter(author=obj)
-    recipes_limit = self.context.get('recipes_limit')
-    if recipes_limit is not None:
-        try:
-            recipes_limit = int(recipes_limit)
-            recipes = recipes[:recipes_limit]
-        except ValueError:
-            return Response(
-                {'Ошибка': 'Не правильно задано число limit'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    return recipes
+    if hasattr(obj, 'latest_recipes'):
+        return obj.latest_recipes
+    return latest_recipes(
+        [obj.pk], self.context.get('recipes_limit')
+    )[obj.pk]
 
 
 def get_is_subscribet_for_serizlizer(self, obj):
-    user = self.context.get('current_user')
-    return Subscribe.objects.filter(
-        user=user, author=obj.author
-    ).exists() if user and user.is_authenticated else False
+    if hasattr(obj, 'is_subscribed'):
+        return obj.is_subscribed
+    return obj.pk in get_follow_set(self.context.get('request'))
 
 
-def add_recipe_to_list(model, user, recipe_id, serializer_class):
-    recipe = get_object_or_404(Recipe, id=recipe_id)
-    item, created = model.objects.get_or_create(user=user, recipe=recipe)
-    if created:
-        serializer = serializer_class(item)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(
-        {'detail': 'Этот рецепт уже в вашей коллекции.'},
-        status=status.HTTP_400_BAD_REQUEST,
+def get_recipes_limit(request):
+    """Параметр recipes_limit запроса или None, если он не задан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return None
+    if not recipes_limit.isdigit():
+        raise ValidationError(
+            {'recipes_limit': 'Нужно целое неотрицательное число.'}
+        )
+    return int(recipes_limit)
+
+
+def insert_links(model, user_id, field, target_ids):
+    """Связывает пользователя с объектами одним запросом.
+
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING вставляет
+    строки только для существующих объектов, с которыми связи ещё нет.
+    Возвращает словарь: id объекта -> id новой строки.
+    """
+    if not target_ids:
+        return {}
+    quote = connection.ops.quote_name
+    target = model._meta.get_field(field)
+    related = target.related_model._meta
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(model._meta.get_field("user").column)}, '
+        f'{quote(target.column)}) '
+        f'SELECT %s, {quote(related.pk.column)} '
+        f'FROM {quote(related.db_table)} '
+        f'WHERE {quote(related.pk.column)} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING '
+        f'RETURNING {quote(target.column)}, {quote(model._meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *target_ids])
+        return dict(cursor.fetchall())
+
+
+def insert_link(model, user_id, field, target_id):
+    """id новой строки или None, если объекта нет или связь уже есть."""
+    return insert_links(model, user_id, field, [target_id]).get(target_id)
+
+
+def delete_links(model, user_id, field, target_ids):
+    """Удаляет связи пользователя одним DELETE ... RETURNING.
+
+    Возвращает id объектов, связь с которыми удалил именно этот запрос.
+    """
+    quote = connection.ops.quote_name
+    target = quote(model._meta.get_field(field).column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(model._meta.get_field("user").column)} = %s '
+        f'AND {target} IN ({placeholders}) RETURNING {target}'
     )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *target_ids])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def update_counter_returning(model, pk, field, delta):
+    """Сдвигает счётчик и тем же запросом читает обновлённый объект."""
+    quote = connection.ops.quote_name
+    column = quote(model._meta.get_field(field).column)
+    return next(iter(model.objects.raw(
+        f'UPDATE {quote(model._meta.db_table)} '
+        f'SET {column} = {column} + %s '
+        f'WHERE {quote(model._meta.pk.column)} = %s RETURNING *',
+        [delta, pk],
+    )), None)
+
+
+def add_recipe_to_list(model, user, recipe_id, serializer_class):
+    with transaction.atomic():
+        item_id = insert_link(model, user.pk, 'recipe', recipe_id)
+        if item_id is not None:
+            recipe = update_counter_returning(
+                Recipe, recipe_id, LIST_COUNTERS[model], 1
+            )
+            if model is ShoppingCart:
+                add_to_shopping_totals([recipe_id], user.pk)
+                bump_cart_version(User.objects.filter(pk=user.pk))
+    if item_id is None:
+        get_object_or_404(Recipe, id=recipe_id)
+        return Response(
+            {'detail': 'Этот рецепт уже в вашей коллекции.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    serializer = serializer_class(model(id=item_id, user=user, recipe=recipe))
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def remove_recipe_from_list(model, user, recipe_id):
-    recipe = get_object_or_404(Recipe, id=recipe_id)
-    item = model.objects.filter(user=user, recipe=recipe)
-    if not item.exists():
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    item.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(
+            user=user, recipe_id=recipe_id
+        ).delete()
+        if deleted:
+            change_counter(
+                Recipe.objects.filter(pk=recipe_id),
+                LIST_COUNTERS[model],
+                -deleted,
+            )
+            if model is ShoppingCart:
+                subtract_from_shopping_totals([recipe_id], user.pk)
+                bump_cart_version(User.objects.filter(pk=user.pk))
+    if deleted:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(Recipe, id=recipe_id)
+    return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def bulk_results(model, ids, statuses):
+    """Статус каждого id; id без статуса - существующие или not_found."""
+    rest = [pk for pk in ids if pk not in statuses]
+    if rest:
+        statuses.update(dict.fromkeys(
+            model.objects.filter(pk__in=rest).values_list('pk', flat=True),
+            'exists',
+        ))
+    return [
+        {'id': pk, 'status': statuses.get(pk, 'not_found')} for pk in ids
+    ]
+
+
+def recount_list_counter(model, recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{LIST_COUNTERS[model]: count_subquery(model, 'recipe')}
+    )
+
+
+def bulk_add_recipes_to_list(model, user, recipe_ids):
+    """Добавляет рецепты в список одним INSERT.
+
+    Статус каждого id: created, exists или not_found. Итоги корзины
+    меняются только для строк, которые вставил этот запрос.
+    """
+    ids = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        created = list(insert_links(model, user.pk, 'recipe', ids))
+        if created:
+            recount_list_counter(model, created)
+            if model is ShoppingCart:
+                add_to_shopping_totals(created, user.pk)
+                bump_cart_version(User.objects.filter(pk=user.pk))
+    return bulk_results(Recipe, ids, dict.fromkeys(created, 'created'))
+
+
+def bulk_remove_recipes_from_list(model, user, recipe_ids):
+    """Убирает рецепты из списка одним DELETE.
+
+    Статус каждого id: deleted или missing.
+    """
+    ids = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        deleted = delete_links(model, user.pk, 'recipe', ids)
+        if deleted:
+            recount_list_counter(model, deleted)
+            if model is ShoppingCart:
+                subtract_from_shopping_totals(deleted, user.pk)
+                bump_cart_version(User.objects.filter(pk=user.pk))
+    deleted = set(deleted)
+    return [
+        {'id': pk, 'status': 'deleted' if pk in deleted else 'missing'}
+        for pk in ids
+    ]
+
+
+def recount_followers(author_ids):
+    User.objects.filter(pk__in=author_ids).update(
+        followers_count=count_subquery(Subscribe, 'author')
+    )
+
+
+def bulk_subscribe(user, author_ids):
+    """Подписывает на авторов одним INSERT.
+
+    Статус каждого id: created, exists, self или not_found.
+    """
+    ids = list(dict.fromkeys(author_ids))
+    with transaction.atomic():
+        created = list(insert_links(
+            Subscribe, user.pk, 'author', [pk for pk in ids if pk != user.pk]
+        ))
+        if created:
+            recount_followers(created)
+            fill_timelines(Subscribe.objects.filter(
+                user=user, author_id__in=created
+            ))
+            invalidate_follow_set(user.pk)
+    statuses = dict.fromkeys(created, 'created')
+    if user.pk in ids:
+        statuses[user.pk] = 'self'
+    return bulk_results(User, ids, statuses)
+
+
+def bulk_unsubscribe(user, author_ids):
+    """Отписывает от авторов одним DELETE.
+
+    Статус каждого id: deleted или missing.
+    """
+    ids = list(dict.fromkeys(author_ids))
+    with transaction.atomic():
+        deleted = delete_links(Subscribe, user.pk, 'author', ids)
+        if deleted:
+            recount_followers(deleted)
+            remove_authors_from_timeline(user.pk, deleted)
+            invalidate_follow_set(user.pk)
+    deleted = set(deleted)
+    return [
+        {'id': pk, 'status': 'deleted' if pk in deleted else 'missing'}
+        for pk in ids
+    ]
 
 
 def process_ingredients(recipe, ingredients_data):
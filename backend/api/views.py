@@ -1,24 +1,45 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, mixins, permissions, status, viewsets
-from rest_framework.pagination import (LimitOffsetPagination,
-                                       PageNumberPagination)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from foodgram.const import SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT
 from users.models import Favorite, ShoppingCart, Subscribe
+from .autocomplete import ingredient_autocomplete
+from .cache import RECIPES_VERSION_KEY, get_or_refresh, request_cache_key
+from .catalog import recipe_catalog
+from .exports import (DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS,
+                      ExportFormatNegotiation, shopping_list_response)
+from .facets import FACET_FILTERS, parse_facets, recipe_facets
+from .feed import add_author_to_timeline, remove_authors_from_timeline
 from .filters import IngredientFilter, RecipeFilter
+from .follows import get_follow_set, invalidate_follow_set
+from .fragments import FRAGMENT_FIELDS, render_recipes
 from .models import Ingredient, Recipe, Tag
+from .pagination import (FeedCursorPagination, RecipePagination,
+                         SubscriptionPagination)
 from .permissions import IsAuthenticatedOrAuthor
-from .serializers import (AvatarSerializer, FavoriteSerializer,
+from .serializers import (AvatarSerializer, BulkIdsSerializer,
+                          FavoriteSerializer,
                           IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscribeSerializer,
-                          TagSerializer, UserProfileSerializer,
+                          ShoppingCartSerializer, TagSerializer,
+                          UserProfileSerializer,
                           UserProfileSerializerWithRecipes)
-from .utils import (add_recipe_to_list, create_short_link,
-                    generate_shopping_list, remove_recipe_from_list)
+from .snapshots import ingredients_snapshot, tags_snapshot
+from .suggest import suggest_index
+from .utils import (add_recipe_to_list, bulk_add_recipes_to_list,
+                    bulk_remove_recipes_from_list, bulk_subscribe,
+                    bulk_unsubscribe, change_counter, create_short_link,
+                    get_recipes_limit, insert_link, latest_recipes,
+                    remove_recipe_from_list, resolve_short_code,
+                    update_counter_returning)
 
 User = get_user_model()
 
@@ -52,6 +73,9 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
     lookup_field = 'id'
 
+    def list(self, request, *args, **kwargs):
+        return tags_snapshot.response(request)
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
@@ -61,6 +85,20 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientFilter
     lookup_field = 'id'
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return ingredients_snapshot.response(request)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit() or int(limit) < 1:
+                return Response(
+                    {'limit': 'Нужно целое положительное число.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            limit = int(limit)
+        return ingredient_autocomplete.response(name, limit)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -68,7 +106,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [IsAuthenticatedOrAuthor]
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return Recipe.objects.with_user_flags(
+                self.request.user
+            ).only(*FRAGMENT_FIELDS)
+        return super().get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        if parse_facets(request.query_params.get('facets', '')) is None:
+            return Response(
+                {'facets': 'Допустимые значения: {}.'.format(
+                    ', '.join(FACET_FILTERS)
+                )},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if request.user.is_authenticated:
+            return self.list_recipes(request)
+        return Response(get_or_refresh(
+            request_cache_key('recipes:anonymous', request),
+            RECIPES_VERSION_KEY,
+            lambda: self.list_recipes(request).data,
+        ))
+
+    def list_recipes(self, request):
+        queryset = None
+        if (
+            settings.RECIPE_CATALOG_ENGINE
+            and not self.paginator.use_cursor(request)
+        ):
+            queryset = recipe_catalog.select(request, self.get_queryset())
+        if queryset is None:
+            queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        if page is not None:
+            response = self.get_paginated_response(
+                render_recipes(page, context)
+            )
+        else:
+            response = Response(render_recipes(queryset, context))
+        facets = parse_facets(request.query_params.get('facets', ''))
+        if facets and page is not None:
+            response.data['facets'] = recipe_facets(request, facets)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = get_object_or_404(self.get_queryset(), pk=kwargs['pk'])
+        self.check_object_permissions(request, recipe)
+        etag = '"{}-{}-{}"'.format(
+            recipe.pk,
+            recipe.updated_at.timestamp(),
+            ''.join(
+                str(int(flag)) for flag in (
+                    recipe.is_favorited,
+                    recipe.is_in_shopping_cart,
+                    recipe.author_id in get_follow_set(request),
+                )
+            ),
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(
+                render_recipes([recipe], self.get_serializer_context())[0]
+            )
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+        )
+        instance.delete()
 
 
 class FavoriteView(APIView):
@@ -87,6 +200,7 @@ class FavoriteView(APIView):
 class ShoppingCartView(APIView, mixins.DestroyModelMixin):
 
     permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = ExportFormatNegotiation
 
     def post(self, request, id):
         return add_recipe_to_list(
@@ -97,69 +211,145 @@ class ShoppingCartView(APIView, mixins.DestroyModelMixin):
         return remove_recipe_from_list(ShoppingCart, request.user, id)
 
     def get(self, request):
-        user = request.user
-        recipes = ShoppingCart.objects.filter(user=user)
-
-        if not recipes.exists():
+        export_format = request.query_params.get(
+            'format', DEFAULT_EXPORT_FORMAT
+        )
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'format': 'Допустимые значения: {}.'.format(
+                    ', '.join(EXPORT_FORMATS)
+                )},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = shopping_list_response(request, export_format)
+        if response is None:
             return Response({'Корзина': 'Корзина пуста.'},
                             status=status.HTTP_200_OK)
+        return response
 
-        pdf_buffer = generate_shopping_list(recipes)
-        response = FileResponse(pdf_buffer, content_type='application/pdf')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.pdf"'
-        )
 
-        return response
+class BulkView(APIView):
+    """Пакетная операция над списком id из тела запроса."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_ids(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+
+class BulkRecipeListView(BulkView):
+    """Добавление и удаление пачки рецептов в избранном или корзине."""
+
+    model = None
+
+    def post(self, request):
+        return Response({'results': bulk_add_recipes_to_list(
+            self.model, request.user, self.get_ids(request)
+        )})
+
+    def delete(self, request):
+        return Response({'results': bulk_remove_recipes_from_list(
+            self.model, request.user, self.get_ids(request)
+        )})
+
+
+class BulkFavoriteView(BulkRecipeListView):
+    model = Favorite
+
+
+class BulkShoppingCartView(BulkRecipeListView):
+    model = ShoppingCart
+
+
+class BulkSubscribeView(BulkView):
+    """Подписка и отписка от пачки авторов."""
+
+    def post(self, request):
+        return Response({'results': bulk_subscribe(
+            request.user, self.get_ids(request)
+        )})
+
+    def delete(self, request):
+        return Response({'results': bulk_unsubscribe(
+            request.user, self.get_ids(request)
+        )})
 
 
 class SubscribeViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializerWithRecipes
-    pagination_class = LimitOffsetPagination
+    pagination_class = SubscriptionPagination
+    ordering = ('-subscription_id',)
 
     def get_queryset(self):
-        return User.objects.filter(subscribing__user=self.request.user)
+        return User.objects.filter(
+            subscribing__user=self.request.user
+        ).annotate(
+            subscription_id=F('subscribing__id'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by(*self.ordering)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
+        page = self.paginate_queryset(self.get_queryset())
+        authors = page if page is not None else list(self.get_queryset())
+        context = self.get_serializer_context()
+        recipes = latest_recipes(
+            [author.pk for author in authors], context['recipes_limit']
+        )
+        for author in authors:
+            author.latest_recipes = recipes[author.pk]
+        serializer = self.get_serializer(authors, many=True, context=context)
         if page is not None:
-            serializer = self.get_serializer(
-                page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(
-            queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         user = request.user
         author_id = self.kwargs.get('id')
-        author = get_object_or_404(User, id=author_id)
-        if user == author:
+        if user.pk == author_id:
             return Response(
                 {'Подписка': 'Нельзя подписаться на самого себя!'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        subscription, created = Subscribe.objects.get_or_create(
-            user=user, author=author)
-        if created:
-            serializer = SubscribeSerializer(
-                author, context=self.get_serializer_context())
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(
-            {'Подписка': 'Вы уже подписаны.'},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+        with transaction.atomic():
+            subscription_id = insert_link(
+                Subscribe, user.pk, 'author', author_id
+            )
+            if subscription_id is not None:
+                author = update_counter_returning(
+                    User, author_id, 'followers_count', 1
+                )
+                add_author_to_timeline(user.pk, author)
+                invalidate_follow_set(user.pk)
+        if subscription_id is None:
+            get_object_or_404(User, id=author_id)
+            return Response(
+                {'Подписка': 'Вы уже подписаны.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        author.is_subscribed = True
+        serializer = self.get_serializer(author)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, *args, **kwargs):
         author_id = self.kwargs.get('id')
-        author = get_object_or_404(User, id=author_id)
-        subscription = Subscribe.objects.filter(
-            user=request.user, author=author)
-        if subscription.exists():
-            subscription.delete()
+        with transaction.atomic():
+            deleted, _ = Subscribe.objects.filter(
+                user=request.user, author_id=author_id
+            ).delete()
+            if deleted:
+                change_counter(
+                    User.objects.filter(pk=author_id),
+                    'followers_count',
+                    -deleted,
+                )
+                remove_authors_from_timeline(request.user.pk, [author_id])
+                invalidate_follow_set(request.user.pk)
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=author_id)
         return Response(
             {'Подписка': 'Вы не подписаны на данного пользователя.'},
             status=status.HTTP_400_BAD_REQUEST,
@@ -167,19 +357,62 @@ class SubscribeViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context['current_user'] = self.request.user
+        context['recipes_limit'] = get_recipes_limit(self.request)
         return context
 
 
+class RecipeFeedView(generics.GenericAPIView):
+    """Лента рецептов авторов, на которых подписан пользователь."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
+
+    def get(self, request):
+        page = self.paginate_queryset(
+            Recipe.objects.with_user_flags(request.user).only(
+                *FRAGMENT_FIELDS
+            )
+        )
+        return self.get_paginated_response(
+            render_recipes(page, self.get_serializer_context())
+        )
+
+
 class GetRecipeLinkView(APIView):
 
     def get(self, request, id):
         return Response(
-            {
-                'short-link': create_short_link(
-                    request.build_absolute_uri(f'/recipes/{id}/')
-                )
-            },
+            {'short-link': create_short_link(request, id)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ShortLinkRedirectView(APIView):
+    """Переход по короткой ссылке на страницу рецепта."""
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, code):
+        return HttpResponseRedirect(resolve_short_code(code))
+
+
+class SearchSuggestView(APIView):
+    """Подсказки с опечатками по рецептам, ингредиентам и авторам."""
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        limit = request.query_params.get('limit', str(SUGGEST_DEFAULT_LIMIT))
+        if not limit.isdigit() or int(limit) < 1:
+            return Response(
+                {'limit': 'Нужно целое положительное число.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not query:
+            return Response([], status=status.HTTP_200_OK)
+        return Response(
+            suggest_index.suggest(query, min(int(limit), SUGGEST_MAX_LIMIT)),
             status=status.HTTP_200_OK,
         )
 
@@ -4,3 +4,29 @@ MAX_LENGTH_EMAIL = 254
 MAX_LENGTH_SERIALIZERS = 150
 MAX_LENGTH_TAG = 32
 MAX_LENGTH_USER_NAME = 50
+EXACT_COUNT_THRESHOLD = 1000
+ESTIMATED_COUNT_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_FRESH_TIMEOUT = 60
+RESPONSE_CACHE_STALE_TIMEOUT = 60 * 60
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+SUGGEST_THRESHOLD = 0.5
+SUGGEST_MAX_CANDIDATES = 2000
+SUGGEST_JOURNAL_MAX_LAG = 10000
+SUGGEST_JOURNAL_TIMEOUT = 60 * 60 * 24
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+FACET_AUTHORS_LIMIT = 10
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+EXPORT_CACHE_MAX_ITEM = 4 * 1024 * 1024
+SHORT_LINK_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+SHORT_LINK_MAX_LENGTH = 11
+FEED_TIMELINE_LENGTH = 500
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_FANOUT_WORKERS = 2
+FOLLOW_SET_CACHE_TIMEOUT = 60 * 60
+BULK_MAX_SIZE = 100
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 
-from api.views import (AvatarView, FavoriteView, GetRecipeLinkView,
-                       IngredientViewSet, RecipeViewSet, ShoppingCartView,
-                       SubscribeViewSet, TagViewSet, UserProfile)
+from api.views import (AvatarView, BulkFavoriteView, BulkShoppingCartView,
+                       BulkSubscribeView, FavoriteView, GetRecipeLinkView,
+                       IngredientViewSet, RecipeFeedView, RecipeViewSet,
+                       SearchSuggestView, ShoppingCartView,
+                       ShortLinkRedirectView, SubscribeViewSet, TagViewSet,
+                       UserProfile)
 
 Tags = [
     path('', TagViewSet.as_view({'get': 'list'}), name='tag-list'),
@@ -26,12 +29,20 @@ Ingredients = [
 Users = [
     path('me/avatar/', AvatarView.as_view(), name='avatars'),
     path('subscriptions/', SubscribeViewSet.as_view({'get': 'list'})),
+    path('subscribe/', BulkSubscribeView.as_view(), name='bulk-subscribe'),
     path('<int:id>/subscribe/',
          SubscribeViewSet.as_view({'post': 'create', 'delete': 'destroy'})),
     path('me/', UserProfile.as_view(), name='user-me')
 ]
 
 Recipes = [
+    path('feed/', RecipeFeedView.as_view(), name='recipe-feed'),
+    path('favorite/', BulkFavoriteView.as_view(), name='bulk-favorite'),
+    path(
+        'shopping_cart/',
+        BulkShoppingCartView.as_view(),
+        name='bulk-shopping-cart',
+    ),
     path(
         '<int:id>/shopping_cart/',
         ShoppingCartView.as_view(),
@@ -60,11 +71,16 @@ Recipes = [
          name='recipe-detail'),
 ]
 
+Search = [
+    path('suggest/', SearchSuggestView.as_view(), name='search-suggest'),
+]
+
 Api = [
     path('users/', include(Users)),
     path('tags/', include(Tags)),
     path('ingredients/', include(Ingredients)),
     path('recipes/', include(Recipes)),
+    path('search/', include(Search)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -73,4 +89,7 @@ Api = [
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(Api)),
+    path(
+        's/<str:code>/', ShortLinkRedirectView.as_view(), name='short-link'
+    ),
 ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:42
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_links(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_user_counters(apps, schema_editor):
+    User = apps.get_model('users', 'FoodGrammUser')
+    User.objects.update(
+        recipes_count=count_links(apps.get_model('api', 'Recipe'), 'author'),
+        followers_count=count_links(
+            apps.get_model('users', 'Subscribe'), 'author'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_recipe_counters'),
+        ('users', '0013_subscribe_user_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgrammuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='foodgrammuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.RunPython(
+            fill_user_counters, migrations.RunPython.noop
+        ),
+    ]
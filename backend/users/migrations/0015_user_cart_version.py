@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgrammuser',
+            name='cart_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия списка покупок'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+CHUNK_SIZE = 1000
+
+
+def fill_shopping_totals(apps, schema_editor):
+    ShoppingCart = apps.get_model('users', 'ShoppingCart')
+    ShoppingTotal = apps.get_model('users', 'ShoppingTotal')
+    rows = ShoppingCart.objects.values(
+        'user_id', 'recipe__ingredient_list__ingredient_id'
+    ).filter(
+        recipe__ingredient_list__isnull=False
+    ).annotate(total=Sum('recipe__ingredient_list__amount')).order_by()
+    ShoppingTotal.objects.bulk_create(
+        (
+            ShoppingTotal(
+                user_id=row['user_id'],
+                ingredient_id=row['recipe__ingredient_list__ingredient_id'],
+                total_amount=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=CHUNK_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_recipe_search_vector'),
+        ('users', '0015_user_cart_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to='api.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingtotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_totals, migrations.RunPython.noop
+        ),
+    ]
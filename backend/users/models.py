@@ -21,6 +21,24 @@ class FoodGrammUser(AbstractUser):
         verbose_name='Ник',
     )
 
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    cart_version = models.PositiveIntegerField(
+        verbose_name='Версия списка покупок',
+        default=0,
+        editable=False,
+    )
+
     def __str__(self):
         return self.username
 
@@ -46,6 +64,11 @@ class Subscribe(models.Model):
                 fields=['user', 'author'], name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-id'], name='subscribe_user_id_idx'
+            ),
+        ]
     verbose_name = 'Подписка'
     verbose_name_plural = 'Подписки'
 
@@ -92,3 +115,27 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_user_recipe_scart')
         ]
+
+
+class ShoppingTotal(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        FoodGrammUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        'api.Ingredient',
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_user_ingredient_total')
+        ]